@@ -4,6 +4,8 @@
 """
 from playwright.sync_api import sync_playwright
 import re
+import shutil
+import tempfile
 import time
 import random
 from typing import List, Dict, Any, Optional, Tuple
@@ -17,6 +19,9 @@ from .config import (
 )
 
 
+# 4 碼股票代碼檢查（熱路徑逐列呼叫，預編譯 regex 比 isdigit+len 快）
+_STOCK_CODE_RE = re.compile(r'\d{4}')
+
 # 中信投信 ETF 基金代碼對照表
 CTBC_ETF_CODES = {
     '00995A': '00653201',  # 中國信託台灣卓越成長主動式ETF基金
@@ -32,11 +37,68 @@ class CTBCScraper:
     
     BASE_URL = "https://www.ctbcinvestments.com"
     DETAIL_URL = "/Etf/{fund_id}/Combination"
-    
+    # DevTools Network 觀察到的 Excel 直接下載端點：能直接下載就不用開瀏覽器
+    EXCEL_URL = "/Etf/{fund_id}/Combination/ExportExcel"
+    USER_AGENT = (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    )
+
+    # Excel 快取：同一 (fund_id, date) 一小時內重跑不再開瀏覽器
+    CACHE_DIR = Path.home() / ".cache" / "ctbc_crawler"
+    CACHE_TTL = 3600  # 秒
+
     def __init__(self):
         """初始化爬蟲"""
         self.request_count = 0
-    
+
+    @classmethod
+    def _cache_path(cls, fund_id: str, date: str) -> Path:
+        """對應 (fund_id, date) 的快取 Excel 路徑"""
+        return cls.CACHE_DIR / f"{fund_id}_{date}.xlsx"
+
+    def _try_http_download(self, fund_id: str) -> Optional[Path]:
+        """
+        嘗試不開瀏覽器、直接用 HTTP 下載 Excel。
+
+        開瀏覽器的唯一目的只是按「下載EXCEL」，若直接下載端點可用，
+        就省下每次 4-8 秒的瀏覽器啟動。失敗（HTTP 錯誤或回傳的不是
+        xlsx）時回傳 None，由呼叫端退回 Playwright 路徑。
+
+        Returns:
+            Optional[Path]: 下載成功時的暫存檔路徑，失敗時 None
+        """
+        import requests
+
+        url = f"{self.BASE_URL}{self.EXCEL_URL.format(fund_id=fund_id)}"
+        detail_url = f"{self.BASE_URL}{self.DETAIL_URL.format(fund_id=fund_id)}"
+        try:
+            response = requests.get(
+                url,
+                headers={'User-Agent': self.USER_AGENT, 'Referer': detail_url},
+                timeout=30,
+                allow_redirects=True,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.info(f"Direct Excel download failed, falling back to browser: {e}")
+            return None
+
+        # xlsx 是 zip 容器，開頭必為 PK；拿到 HTML（如導回登入/錯誤頁）就放棄
+        content_type = response.headers.get('Content-Type', '')
+        if not response.content.startswith(b'PK') or 'html' in content_type.lower():
+            logger.info(
+                f"Direct Excel download returned non-xlsx content "
+                f"(Content-Type: {content_type}), falling back to browser"
+            )
+            return None
+
+        fd, temp_path = tempfile.mkstemp(suffix='.xlsx', prefix='ctbc_')
+        with open(fd, 'wb') as f:
+            f.write(response.content)
+        logger.info(f"Downloaded Excel directly via HTTP to {temp_path}")
+        return Path(temp_path)
+
     def _random_delay(self):
         """隨機延遲，避免被封鎖"""
         delay = random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
@@ -75,14 +137,31 @@ class CTBCScraper:
         """
         import pandas as pd
         import random
-        
+
         holdings = []
         temp_file = None
-        
+
+        # 一天內多次執行爬蟲時，同一 (fund_id, date) 的 Excel 不需要重新開瀏覽器抓，
+        # 直接用一小時內的快取檔（瀏覽器啟動就要 1-2 秒）
+        cache_file = self._cache_path(fund_id, date)
+        if cache_file.exists() and time.time() - cache_file.stat().st_mtime < self.CACHE_TTL:
+            logger.info(f"Using cached Excel for fund {fund_id} on {date}: {cache_file}")
+            return self._parse_excel(cache_file, date)
+
+        # 先試直接下載端點，成功就完全跳過 Playwright
+        http_file = self._try_http_download(fund_id)
+        if http_file is not None:
+            try:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy(http_file, cache_file)
+            except OSError as e:
+                logger.warning(f"Cannot write Excel cache: {e}")
+            return self._parse_excel(http_file, date)
+
         try:
             url = f"{self.BASE_URL}{self.DETAIL_URL.format(fund_id=fund_id)}"
             logger.info(f"Fetching holdings from {url} via Excel download")
-            
+
             with sync_playwright() as p:
                 # 使用無頭模式並添加反爬蟲參數（CI 環境需要 headless）
                 browser = p.chromium.launch(
@@ -153,10 +232,17 @@ class CTBCScraper:
                         download = download_info.value
                         temp_file = download.path()
                         logger.info(f"Downloaded file to {temp_file}")
-                        
+
+                        # 留一份到快取，給一小時內的重跑使用
+                        try:
+                            cache_file.parent.mkdir(parents=True, exist_ok=True)
+                            shutil.copy(temp_file, cache_file)
+                        except OSError as e:
+                            logger.warning(f"Cannot write Excel cache: {e}")
+
                         # 解析 Excel
                         holdings = self._parse_excel(temp_file, date)
-                        
+
                     else:
                         logger.error("Download button not found")
                         # 備案：嘗試截圖幫助調試
@@ -263,7 +349,7 @@ class CTBCScraper:
                             code = str(row[code_col]).strip().split('.')[0] # 處理可能的浮點數代碼
                             name = str(row[name_col]).strip()
                             
-                            if code.isdigit() and len(code) == 4:
+                            if _STOCK_CODE_RE.fullmatch(code):
                                 shares = 0
                                 weight = 0.0
                                 
@@ -305,7 +391,7 @@ class CTBCScraper:
                     shares = self._parse_number(cells[4].inner_text())
                     weight = self._parse_percentage(cells[5].inner_text())
                     
-                    if code.isdigit() and len(code) == 4:
+                    if _STOCK_CODE_RE.fullmatch(code):
                         holdings.append({
                             'stock_code': code,
                             'stock_name': name,
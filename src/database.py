@@ -92,25 +92,33 @@ class Database:
         """
         conn = self.get_connection()
         cursor = conn.cursor()
-        
+
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        for etf in etf_list:
-            cursor.execute("""
-                INSERT OR REPLACE INTO etf_list 
-                (etf_code, etf_name, issuer, listing_date, last_updated)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                etf.get('etf_code'),
-                etf.get('etf_name'),
-                etf.get('issuer', ''),
-                etf.get('listing_date', ''),
-                current_time
-            ))
-        
-        conn.commit()
+
+        # 整批包在一個交易裡，避免 sqlite3 替每條 DML 各開一次交易邊界
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for etf in etf_list:
+                cursor.execute("""
+                    INSERT OR REPLACE INTO etf_list
+                    (etf_code, etf_name, issuer, listing_date, last_updated)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (
+                    etf.get('etf_code'),
+                    etf.get('etf_name'),
+                    etf.get('issuer', ''),
+                    etf.get('listing_date', ''),
+                    current_time
+                ))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Error inserting ETF list, rolled back: {e}")
+            conn.close()
+            raise
+
         conn.close()
-        
+
         logger.info(f"Inserted/Updated {len(etf_list)} ETFs")
     
     @staticmethod
@@ -251,6 +259,9 @@ class Database:
                 conn.close()
                 return 0
 
+        # 整批寫入只開一個交易：千列等級的寫入從逐條 commit 變成一次 fsync
+        conn.execute("BEGIN IMMEDIATE")
+
         for holding in holdings:
             try:
                 etf_code = holding.get('etf_code')
@@ -311,8 +322,14 @@ class Database:
                     
             except sqlite3.Error as e:
                 logger.error(f"Error inserting/updating holding: {e}")
-        
-        conn.commit()
+
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            conn.close()
+            logger.error(f"Error committing holdings, rolled back: {e}")
+            raise
         conn.close()
         
         if updated_count > 0:
@@ -348,6 +365,20 @@ class Database:
         conn.close()
         return results
     
+    @staticmethod
+    def _normalize_holding_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        以代號為主鍵統一持股列的台股顯示名稱（各投信原始名稱格式不一）
+
+        所有讀取 holdings 的查詢方法都必須經過這裡，名稱對照才有
+        單一插入點；新增讀取路徑時呼叫本方法，不要各自套 canonical_name
+        """
+        row['stock_name'] = canonical_name(
+            row.get('stock_code', ''),
+            row.get('stock_name', '')
+        )
+        return row
+
     def get_holdings_by_date(self, date: str, etf_code: str = None) -> List[Dict[str, Any]]:
         """
         獲取指定日期的持股明細
@@ -380,13 +411,9 @@ class Database:
 
         conn.close()
 
-        # 以代號為主鍵統一台股顯示名稱（各投信原始名稱格式不一）。
-        # 此為所有報表輸出讀取持股名稱的單一出口，故在此正規化即可全面套用。
+        # 統一顯示名稱：一律走 _normalize_holding_row（名稱對照的單一插入點）
         for row in results:
-            row['stock_name'] = canonical_name(
-                row.get('stock_code', ''),
-                row.get('stock_name', '')
-            )
+            self._normalize_holding_row(row)
 
         return results
 
@@ -470,9 +497,120 @@ class Database:
         
         result = cursor.fetchone()[0]
         conn.close()
-        
+
         return result
-    
+
+    def get_latest_dates_on_or_before(
+        self, etf_codes: List[str], date: str
+    ) -> Dict[str, str]:
+        """
+        get_latest_date_on_or_before 的批次版：一次查詢取回多檔 ETF 的最新資料日期
+
+        逐檔呼叫單檔版是典型的 N+1 查詢——每檔各開一條連線、各跑一次查詢；
+        改用 GROUP BY 讓 SQLite 在一次掃描內算完所有 ETF 的 MAX(date)。
+
+        Args:
+            etf_codes: ETF 代碼列表
+            date: 上限日期（含）
+
+        Returns:
+            Dict[str, str]: ETF 代碼 -> 最新資料日期；期限內無資料的 ETF 不在結果中
+        """
+        if not etf_codes:
+            return {}
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        placeholders = ','.join('?' * len(etf_codes))
+        cursor.execute(f"""
+            SELECT etf_code, MAX(date) FROM holdings
+            WHERE etf_code IN ({placeholders}) AND date <= ?
+            GROUP BY etf_code
+        """, (*etf_codes, date))
+
+        results = {row[0]: row[1] for row in cursor.fetchall()}
+        conn.close()
+        return results
+
+    def get_previous_trading_dates(
+        self, etf_dates: Dict[str, str]
+    ) -> Dict[str, str]:
+        """
+        get_previous_trading_date 的批次版：每檔 ETF 以各自的基準日取前一個資料日期
+
+        各檔的基準日不同（資料日期天然不同步），不能共用單一 date < ? 條件；
+        把 (etf_code, 基準日) 以 CTE VALUES 餵進查詢、JOIN 後 GROUP BY，
+        一次往返取代逐檔查詢。
+
+        Args:
+            etf_dates: ETF 代碼 -> 各自的基準日期 (YYYY-MM-DD)
+
+        Returns:
+            Dict[str, str]: ETF 代碼 -> 前一個資料日期；無更早資料的 ETF 不在結果中
+        """
+        if not etf_dates:
+            return {}
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        values = ','.join(['(?,?)'] * len(etf_dates))
+        params = [v for item in etf_dates.items() for v in item]
+        cursor.execute(f"""
+            WITH cutoffs(etf_code, cutoff) AS (VALUES {values})
+            SELECT h.etf_code, MAX(h.date)
+            FROM holdings h
+            JOIN cutoffs c ON h.etf_code = c.etf_code AND h.date < c.cutoff
+            GROUP BY h.etf_code
+        """, params)
+
+        results = {row[0]: row[1] for row in cursor.fetchall()}
+        conn.close()
+        return results
+
+    def get_holdings_for_etf_dates(
+        self, pairs: List[tuple]
+    ) -> Dict[tuple, List[Dict[str, Any]]]:
+        """
+        一次取回多組 (etf_code, date) 的持股明細
+
+        與 get_holdings_by_date 同樣的欄位與排序（權重由高至低），
+        名稱正規化同樣走 _normalize_holding_row——批次路徑的輸出
+        必須和單檔路徑完全一致，報表端才能混用。
+
+        Args:
+            pairs: (etf_code, date) 組合列表
+
+        Returns:
+            Dict[tuple, List[Dict]]: (etf_code, date) -> 持股明細（無資料的組合為空列表）
+        """
+        if not pairs:
+            return {}
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        values = ','.join(['(?,?)'] * len(pairs))
+        params = [v for pair in pairs for v in pair]
+        cursor.execute(f"""
+            WITH wanted(etf_code, date) AS (VALUES {values})
+            SELECT h.* FROM holdings h
+            JOIN wanted w ON h.etf_code = w.etf_code AND h.date = w.date
+            ORDER BY h.etf_code, h.weight DESC
+        """, params)
+
+        columns = [desc[0] for desc in cursor.description]
+        grouped: Dict[tuple, List[Dict[str, Any]]] = {
+            tuple(pair): [] for pair in pairs
+        }
+        for raw in cursor.fetchall():
+            row = self._normalize_holding_row(dict(zip(columns, raw)))
+            grouped[(row['etf_code'], row['date'])].append(row)
+
+        conn.close()
+        return grouped
+
     def get_statistics(self) -> Dict[str, Any]:
         """
         獲取資料庫統計資訊
@@ -2,10 +2,12 @@
 ETF 市場資料模組 - 從證交所及 Yahoo Finance 取得 ETF 基金規模、市價、成交金額等資訊
 """
 import json
+import random
 import re
 import requests
 import time
 import urllib3
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any
@@ -28,16 +30,26 @@ class ETFMarketDataFetcher:
     def __init__(self, output_dir: Path = None):
         self.output_dir = output_dir or Path("docs")
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 同一執行緒內對 TWSE / Yahoo 的多次請求共用一條 keep-alive 連線，
+        # 省掉每次請求的 TCP+TLS 握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.ua = UserAgent()
-
-    def _get_headers(self) -> dict:
-        return {
-            "User-Agent": self.ua.random,
+        # fake_useragent 每次 .random 都要查它的 UA 資料庫，逐請求呼叫很浪費；
+        # 初始化時先抽一池，之後用 random.choice 輪換即可
+        self._ua_pool = tuple(self.ua.random for _ in range(64))
+        # User-Agent 以外的標頭都是固定的，建一次重複使用
+        self._base_headers = {
             "Accept": "application/json, text/plain, */*",
             "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
             "Referer": "https://www.twse.com.tw/",
         }
 
+    def _get_headers(self) -> dict:
+        return {**self._base_headers, "User-Agent": random.choice(self._ua_pool)}
+
     def fetch_stock_day_all(self) -> Dict[str, Dict[str, Any]]:
         """
         從 TWSE OpenData 取得所有上市股票/ETF 每日收盤行情
@@ -48,7 +60,7 @@ class ETFMarketDataFetcher:
         logger.info("Fetching STOCK_DAY_ALL from TWSE OpenData")
 
         try:
-            resp = requests.get(
+            resp = self.session.get(
                 self.TWSE_STOCK_DAY_ALL_URL,
                 headers=self._get_headers(),
                 timeout=30,
@@ -94,7 +106,7 @@ class ETFMarketDataFetcher:
         logger.info(f"Fetching realtime price for {len(etf_codes)} ETFs")
 
         try:
-            resp = requests.get(
+            resp = self.session.get(
                 self.TWSE_STOCK_INFO_URL,
                 params={"ex_ch": ex_ch},
                 headers=self._get_headers(),
@@ -146,10 +158,10 @@ class ETFMarketDataFetcher:
         for i, code in enumerate(etf_codes):
             try:
                 url = yahoo_url.format(code=code)
-                resp = requests.get(
+                resp = self.session.get(
                     url,
                     headers={
-                        "User-Agent": self.ua.random,
+                        "User-Agent": random.choice(self._ua_pool),
                         "Accept": "text/html,application/xhtml+xml",
                         "Accept-Language": "zh-TW,zh;q=0.9",
                     },
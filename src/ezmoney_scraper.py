@@ -5,23 +5,90 @@ EZMoney ETF 爬蟲模組
 1. Playwright 網頁下載 Excel (主要方式，更可靠)
 2. API 直接抓取 PCF 數據 (備用方式)
 """
+import re
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from playwright.sync_api import sync_playwright
-import time
-import random
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+import openpyxl
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional
 from datetime import datetime
 from pathlib import Path
 from loguru import logger
-import pandas as pd
 
 from .config import (
     REQUEST_DELAY_MIN,
-    REQUEST_DELAY_MAX,
-    MAX_RETRIES
+    REQUEST_DELAY_MAX
 )
+from .http_utils import get_shared_session
+from .utils import RateLimiter
+
+# PCF 回應的 Details 陣列可達數百筆，orjson（C 實作）解析快 2-5 倍且直接
+# 吃 bytes，省掉一次 UTF-8 解碼；未安裝時退回內建 json
+try:
+    import orjson as _json_impl
+
+    def _json_loads(raw: bytes) -> Any:
+        return _json_impl.loads(raw)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return _json_impl.dumps(obj)
+except ImportError:
+    import json as _json_impl
+
+    def _json_loads(raw: bytes) -> Any:
+        return _json_impl.loads(raw)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return _json_impl.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+@lru_cache(maxsize=4096)
+def _to_roc_date(date_str: str) -> str:
+    """
+    將西元日期轉換為民國年格式
+
+    直接切字串、不經 datetime.strptime（strptime 一次約 10 µs），
+    並以 lru_cache 記憶：回補時同一天會跨 ETF 重複轉換。
+
+    Args:
+        date_str: 西元日期 (YYYY-MM-DD)
+
+    Returns:
+        str: 民國年日期 (YYY/MM/DD)
+
+    Examples:
+        >>> _to_roc_date('2025-01-26')
+        '114/01/26'
+    """
+    return f"{int(date_str[:4]) - 1911}/{date_str[5:7]}/{date_str[8:10]}"
+
+
+@lru_cache(maxsize=4096)
+def _from_roc_date(roc_date_str: str) -> str:
+    """
+    將民國年格式轉換為西元日期
+
+    Args:
+        roc_date_str: 民國年日期 (YYY/MM/DD)
+
+    Returns:
+        str: 西元日期 (YYYY-MM-DD)
+
+    Examples:
+        >>> _from_roc_date('114/01/26')
+        '2025-01-26'
+    """
+    parts = roc_date_str.split('/')
+    return f"{int(parts[0]) + 1911}-{int(parts[1]):02d}-{int(parts[2]):02d}"
+
+
+# 數值清理用的刪除表：str.translate 一趟 C 掃描就完成，
+# 連續兩次 str.replace 要各自配置中間字串、掃兩趟
+_NUM_STRIP = str.maketrans('', '', ', \t')
+_PCT_STRIP = str.maketrans('', '', '%, \t')
+
+# 台股代碼為 4 位數字；預編譯一次，逐列驗證走單趟 C 比對
+_STOCK_CODE_RE = re.compile(r'\d{4}')
 
 
 # EZMoney ETF 基金代碼對照表
@@ -31,55 +98,70 @@ EZMONEY_ETF_CODES = {
     # 未來可以新增其他 ETF 的對照
 }
 
+# 唯讀視圖：get_all_mappings 直接回傳這個，免去每次呼叫的 dict 複製；
+# 透過 add_etf_mapping 對底層 dict 的新增會即時反映在視圖上
+_EZMONEY_CODES_VIEW = MappingProxyType(EZMONEY_ETF_CODES)
+
 
 class EZMoneyScraper:
     """EZMoney 網站 ETF 爬蟲"""
     
     API_URL = "https://www.ezmoney.com.tw/ETF/Transaction/GetPCF"
     INFO_URL = "https://www.ezmoney.com.tw/ETF/Fund/Info"
+
+    # 候選選擇器以逗號聯集一次比對（點第一個命中者），
+    # 取代逐一嘗試、每個落空候選各等 5 秒的寫法
+    TAB_SELECTOR = (
+        ':text-is("基金投資組合"), a:has-text("基金投資組合"), '
+        '#tab-portfolio, .nav-tabs a:has-text("基金投資組合")'
+    )
+    EXPORT_SELECTOR = (
+        ':text-is("匯出XLSX"), button:has-text("匯出"), '
+        'a:has-text("匯出XLSX"), .btn:has-text("匯出"), input[value*="匯出"]'
+    )
+
+    # 過去日期的 PCF 不會再變動，落地快取讓回補重跑完全不打 API
+    CACHE_DIR = Path.home() / ".cache" / "ezmoney_crawler"
     
     def __init__(self):
         """初始化爬蟲"""
         self.session = self._create_session()
         self.request_count = 0
+        self._rate_limiter = RateLimiter(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
+        # Playwright 瀏覽器延遲啟動、跨下載共用（見 _get_browser / close）
+        self._pw = None
+        self._browser = None
+        # 標頭完全固定，建一次重複使用（requests 內部會複製，不怕被改到）
+        self._headers = self._build_headers()
         # 建立下載目錄
         self.download_dir = Path('downloads/ezmoney')
         self.download_dir.mkdir(parents=True, exist_ok=True)
+        # 斷點續抓：已成功解析的 (fund_code, date) 記在 JSONL，
+        # 批次中斷重跑時直接吃磁碟上的 Excel，不再啟動瀏覽器
+        self._checkpoint_path = self.download_dir / 'checkpoint.jsonl'
+        self._done = self._load_checkpoint()
     
     def _create_session(self) -> requests.Session:
         """
-        建立 HTTP Session 並設定重試策略
-        
+        取得 HTTP Session（模組層共用單例，連線池跨實例存活）
+
         Returns:
             requests.Session: 配置好的 session
         """
-        session = requests.Session()
-        
-        # 禁用 SSL 驗證警告
-        import urllib3
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        
-        # 設定重試策略
-        retry_strategy = Retry(
-            total=MAX_RETRIES,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST"]
-        )
-        
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        
-        return session
+        return get_shared_session()
     
     def _get_headers(self) -> Dict[str, str]:
         """
-        獲取請求標頭
-        
+        獲取請求標頭（快取於 __init__，不逐請求重建）
+
         Returns:
             Dict: HTTP Headers
         """
+        return self._headers
+
+    @staticmethod
+    def _build_headers() -> Dict[str, str]:
+        """建立固定的請求標頭"""
         return {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'application/json, text/javascript, */*; q=0.01',
@@ -92,51 +174,74 @@ class EZMoneyScraper:
         }
     
     def _random_delay(self):
-        """隨機延遲，避免被封鎖"""
-        delay = random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
-        logger.debug(f"Waiting {delay:.2f} seconds...")
-        time.sleep(delay)
-    
-    @staticmethod
-    def _convert_to_roc_date(date_str: str) -> str:
+        """限速（token-bucket），請求本身的耗時會折抵等待"""
+        self._rate_limiter.wait()
+
+    def _load_checkpoint(self) -> set:
         """
-        將西元日期轉換為民國年格式
-        
-        Args:
-            date_str: 西元日期 (YYYY-MM-DD)
-        
+        載入斷點紀錄
+
         Returns:
-            str: 民國年日期 (YYY/MM/DD)
-        
-        Examples:
-            >>> _convert_to_roc_date('2025-01-26')
-            '114/01/26'
+            set: 已成功解析的 (fund_code, date) 組合
         """
-        dt = datetime.strptime(date_str, '%Y-%m-%d')
-        roc_year = dt.year - 1911
-        return f"{roc_year}/{dt.month:02d}/{dt.day:02d}"
-    
-    @staticmethod
-    def _convert_from_roc_date(roc_date_str: str) -> str:
+        done = set()
+        if self._checkpoint_path.exists():
+            try:
+                with open(self._checkpoint_path, 'rb') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        entry = _json_loads(line)
+                        done.add((entry['fund_code'], entry['date']))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Corrupt checkpoint file, ignoring: {e}")
+        return done
+
+    def _mark_done(self, fund_code: str, date: str):
+        """把成功解析的 (fund_code, date) 追加進斷點紀錄"""
+        if (fund_code, date) in self._done:
+            return
+        self._done.add((fund_code, date))
+        with open(self._checkpoint_path, 'ab') as f:
+            f.write(_json_dumps({'fund_code': fund_code, 'date': date}) + b'\n')
+
+    def _get_browser(self):
         """
-        將民國年格式轉換為西元日期
-        
-        Args:
-            roc_date_str: 民國年日期 (YYY/MM/DD)
-        
-        Returns:
-            str: 西元日期 (YYYY-MM-DD)
-        
-        Examples:
-            >>> _convert_from_roc_date('114/01/26')
-            '2025-01-26'
-        """
-        parts = roc_date_str.split('/')
-        year = int(parts[0]) + 1911
-        month = int(parts[1])
-        day = int(parts[2])
-        return f"{year}-{month:02d}-{day:02d}"
+        取得共用的 Chromium 實例（首次呼叫才啟動）
+
+        每次下載都重新啟動瀏覽器要 0.3-1 秒，是下載路徑的最大固定開銷；
+        改為整個 scraper 生命週期共用一個瀏覽器，每次下載只另開
+        BrowserContext（便宜兩個數量級）。
+        """
+        if self._browser is None:
+            # 延遲匯入：API 路徑完全用不到 Playwright，放在模組頂端
+            # 會讓每次 import 都多付數百毫秒
+            from playwright.sync_api import sync_playwright
+
+            self._pw = sync_playwright().start()
+            self._browser = self._pw.chromium.launch(headless=True)
+        return self._browser
+
+    def close(self):
+        """關閉共用的 Playwright 瀏覽器；未啟動過則無事發生"""
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._pw is not None:
+            self._pw.stop()
+            self._pw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
+    # 模組層的快取版日期轉換（見 _to_roc_date / _from_roc_date）
+    _convert_to_roc_date = staticmethod(_to_roc_date)
+    _convert_from_roc_date = staticmethod(_from_roc_date)
+
     def get_fund_code(self, etf_code: str) -> Optional[str]:
         """
         獲取 ETF 在 EZMoney 網站的基金代碼
@@ -169,9 +274,22 @@ class EZMoneyScraper:
         Returns:
             Optional[Dict]: API 回應數據，失敗時返回 None
         """
+        # 過去日期的 PCF 是不可變的：回補重跑時直接讀磁碟快取，
+        # 連延遲都省掉。當日資料盤中可能更新，一律走網路。
+        cache_file = None
+        if date < datetime.now().strftime('%Y-%m-%d'):
+            cache_file = self.CACHE_DIR / f"{fund_code}_{date}.json"
+            if cache_file.exists():
+                try:
+                    data = _json_loads(cache_file.read_bytes())
+                    logger.debug("PCF cache hit for {} on {}", fund_code, date)
+                    return data
+                except ValueError as e:
+                    logger.warning(f"Corrupt PCF cache {cache_file}, refetching: {e}")
+
         self._random_delay()
         self.request_count += 1
-        
+
         # 轉換日期格式
         roc_date = self._convert_to_roc_date(date)
         
@@ -183,28 +301,41 @@ class EZMoneyScraper:
         }
         
         logger.info(f"Fetching PCF data for {fund_code} on {date} (ROC: {roc_date})")
-        logger.debug(f"Request payload: {payload}")
+        logger.debug("Request payload: {}", payload)
         
         try:
+            # 自行序列化（orjson，C 實作）再以 data= 傳入，
+            # 避免 requests 內部走一趟 stdlib json.dumps；
+            # Content-Type 已固定在 _headers 裡
             response = self.session.post(
                 self.API_URL,
-                json=payload,
-                headers=self._get_headers(),
+                data=_json_dumps(payload),
+                headers=self._headers,
                 timeout=30,
                 verify=False  # 禁用 SSL 驗證
             )
             response.raise_for_status()
             
-            logger.debug(f"Response status: {response.status_code}")
-            logger.debug(f"Response length: {len(response.text)} characters")
-            logger.debug(f"Response preview: {response.text[:200]}")
+            logger.debug("Response status: {}", response.status_code)
+            logger.debug("Response length: {} characters", len(response.content))
+            logger.opt(lazy=True).debug("Response preview: {}", lambda: response.text[:200])
             
-            if not response.text:
+            # 檢查 content（bytes）而非 text：後者會把整個回應解碼成
+            # str 並快取，白付一趟 UTF-8 解碼（下面解析走的是 bytes）
+            if not response.content:
                 logger.error(f"Empty response received for {fund_code}")
                 return None
             
-            data = response.json()
-            logger.debug(f"Request successful: {fund_code}")
+            data = _json_loads(response.content)
+            logger.debug("Request successful: {}", fund_code)
+
+            if cache_file is not None:
+                try:
+                    cache_file.parent.mkdir(parents=True, exist_ok=True)
+                    cache_file.write_bytes(response.content)
+                except OSError as e:
+                    logger.warning(f"Cannot write PCF cache: {e}")
+
             return data
         
         except requests.exceptions.RequestException as e:
@@ -219,115 +350,194 @@ class EZMoneyScraper:
                 logger.error(f"Response text: {response.text[:500]}")
             return None
     
+    def get_historical_pcf(
+        self,
+        fund_code: str,
+        dates: List[str],
+        max_workers: int = 8
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批次抓取多個日期的 PCF 數據（歷史回補用）
+
+        逐日序列抓取的總耗時是 N×(延遲+RTT)；PCF 抓取純粹是 I/O 等待，
+        用有上限的執行緒池並行後約縮為 N/max_workers×(延遲+RTT)。
+        session 的連線池（32 條）足以涵蓋預設並行度，keep-alive 連線可重用。
+
+        Args:
+            fund_code: EZMoney 基金代碼 (例如: 49YTW)
+            dates: 日期列表 (YYYY-MM-DD)
+            max_workers: 並行上限（預設 8，避免對來源造成壓力）
+
+        Returns:
+            Dict[str, Optional[Dict]]: 日期 -> API 回應數據（失敗的日期為 None）
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not dates:
+            return {}
+
+        logger.info(
+            f"Fetching {len(dates)} PCF snapshots for {fund_code} "
+            f"with {max_workers} workers"
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda d: self.get_pcf_data(fund_code, d), dates
+            )
+            return dict(zip(dates, results))
+
     def download_portfolio_excel(
         self,
         fund_code: str,
-        date: str
+        date: str,
+        force_refresh: bool = False
     ) -> Optional[Path]:
         """
         使用 Playwright 下載基金投資組合 Excel
-        
+
         Args:
             fund_code: EZMoney 基金代碼 (例如: 49YTW)
             date: 日期 (YYYY-MM-DD)，僅用於檔名
-        
+            force_refresh: True 時忽略磁碟上的既有檔案、強制重新下載
+
         Returns:
             Optional[Path]: 下載的檔案路徑，失敗則返回 None
         """
+        # 過去日期的檔案不會再變動：磁碟上已有完整檔案就直接重用，
+        # 整個瀏覽器流程都省掉（當日檔案盤中可能更新，不走捷徑）
+        save_path = self.download_dir / f"{fund_code}_{date.replace('-', '')}.xlsx"
+        if (
+            not force_refresh
+            and date < datetime.now().strftime('%Y-%m-%d')
+            and save_path.exists()
+            and save_path.stat().st_size > 1024
+        ):
+            logger.info(f"Reusing cached Excel: {save_path}")
+            return save_path
+
         logger.info(f"Downloading portfolio Excel for fund {fund_code}")
-        
+
         downloaded_file = None
-        
+
         try:
-            with sync_playwright() as p:
-                # 使用無頭模式（CI 環境需要）
-                browser = p.chromium.launch(headless=True)
-                
-                # 設定下載路徑
-                context = browser.new_context(
-                    accept_downloads=True,
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                )
-                
-                page = context.new_page()
-                
-                # 訪問基金資訊頁面
-                url = f"{self.INFO_URL}?fundCode={fund_code}"
-                logger.debug(f"Navigating to {url}")
-                page.goto(url, timeout=30000)
-                
-                # 等待頁面加載
-                time.sleep(2)
-                
-                # 點擊「基金投資組合」標籤
-                logger.debug("Clicking '基金投資組合' tab")
-                try:
-                    # 嘗試多種選擇器
-                    selectors = [
-                        'text="基金投資組合"',
-                        'a:has-text("基金投資組合")',
-                        '#tab-portfolio',
-                        '.nav-tabs a:has-text("基金投資組合")'
-                    ]
-                    
-                    for selector in selectors:
-                        try:
-                            page.click(selector, timeout=5000)
-                            logger.debug(f"Clicked tab using selector: {selector}")
-                            break
-                        except:
-                            continue
-                    
-                    time.sleep(2)
-                except Exception as e:
-                    logger.warning(f"Could not click portfolio tab: {e}")
-                    # 繼續執行，可能預設就在投資組合頁
-                
-                # 查找並點擊「匯出XLSX」按鈕
-                logger.debug("Looking for Excel export button")
-                
-                # 開始下載監聽
-                with page.expect_download(timeout=30000) as download_info:
-                    # 嘗試多種按鈕選擇器
-                    button_selectors = [
-                        'text="匯出XLSX"',
-                        'button:has-text("匯出")',
-                        'a:has-text("匯出XLSX")',
-                        '.btn:has-text("匯出")',
-                        'input[value*="匯出"]'
-                    ]
-                    
-                    clicked = False
-                    for selector in button_selectors:
-                        try:
-                            page.click(selector, timeout=5000)
-                            logger.debug(f"Clicked export button using selector: {selector}")
-                            clicked = True
-                            break
-                        except:
-                            continue
-                    
-                    if not clicked:
-                        logger.error("Could not find export button")
-                        browser.close()
-                        return None
-                
-                download = download_info.value
-                
-                # 儲存檔案
-                filename = f"{fund_code}_{date.replace('-', '')}.xlsx"
-                save_path = self.download_dir / filename
-                download.save_as(save_path)
-                
-                logger.info(f"Downloaded file: {save_path}")
-                downloaded_file = save_path
-                
-                browser.close()
-        
+            # 共用瀏覽器，每次下載只開新的 context（無頭模式，CI 環境需要）
+            context = self._new_context()
+            try:
+                downloaded_file = self._download_in_context(context, fund_code, date)
+            finally:
+                # 只關 context，瀏覽器留給後續下載重用
+                context.close()
+
         except Exception as e:
             logger.error(f"Error downloading Excel: {e}")
             logger.exception(e)
-        
+
+        return downloaded_file
+
+    def _new_context(self):
+        """在共用瀏覽器上開一個可下載檔案的 BrowserContext"""
+        return self._get_browser().new_context(
+            accept_downloads=True,
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        )
+
+    def download_portfolio_excels(
+        self,
+        fund_code: str,
+        dates: List[str]
+    ) -> Dict[str, Optional[Path]]:
+        """
+        批次下載同一基金多個日期檔名的投資組合 Excel
+
+        共用瀏覽器後，單次下載的固定成本剩 context 建立（約 100ms）；
+        批次模式連 context 也共用，每個日期只付開新分頁的成本（約 10ms）。
+
+        Args:
+            fund_code: EZMoney 基金代碼 (例如: 49YTW)
+            dates: 日期列表 (YYYY-MM-DD)，僅用於檔名
+
+        Returns:
+            Dict[str, Optional[Path]]: 日期 -> 檔案路徑（失敗的日期為 None）
+        """
+        results: Dict[str, Optional[Path]] = {}
+        if not dates:
+            return results
+
+        context = self._new_context()
+        try:
+            for date in dates:
+                try:
+                    results[date] = self._download_in_context(context, fund_code, date)
+                except Exception as e:
+                    logger.error(f"Error downloading Excel for {date}: {e}")
+                    results[date] = None
+        finally:
+            context.close()
+
+        return results
+
+    def _download_in_context(
+        self,
+        context,
+        fund_code: str,
+        date: str
+    ) -> Optional[Path]:
+        """
+        在給定的 BrowserContext 裡開新分頁完成一次下載
+
+        Returns:
+            Optional[Path]: 下載的檔案路徑，找不到匯出按鈕時返回 None
+        """
+        downloaded_file = None
+        page = context.new_page()
+        try:
+            # 訪問基金資訊頁面
+            url = f"{self.INFO_URL}?fundCode={fund_code}"
+            logger.debug("Navigating to {}", url)
+            page.goto(url, timeout=30000)
+
+            # 等待頁面加載：條件式等待在 DOM 就緒時立即返回，
+            # 不像固定 sleep 每次下載都硬吃滿 2 秒
+            page.wait_for_load_state('domcontentloaded')
+
+
+            # 點擊「基金投資組合」標籤
+            # 逗號聯集選擇器一次比對所有候選，Playwright 點第一個命中的；
+            # 逐一嘗試的寫法每個落空的選擇器都要等滿 5 秒 timeout
+            logger.debug("Clicking '基金投資組合' tab")
+            try:
+                page.click(self.TAB_SELECTOR, timeout=10000)
+                # 等匯出按鈕可見即可繼續，取代固定 sleep 2 秒
+                page.wait_for_selector(
+                    self.EXPORT_SELECTOR, state='visible', timeout=10000
+                )
+            except Exception as e:
+                logger.warning(f"Could not click portfolio tab: {e}")
+                # 繼續執行，可能預設就在投資組合頁
+
+            # 查找並點擊「匯出XLSX」按鈕
+            logger.debug("Looking for Excel export button")
+
+            # 開始下載監聽
+            with page.expect_download(timeout=30000) as download_info:
+                try:
+                    page.click(self.EXPORT_SELECTOR, timeout=10000)
+                except Exception:
+                    logger.error("Could not find export button")
+                    return None
+            
+            download = download_info.value
+            
+            # 儲存檔案
+            filename = f"{fund_code}_{date.replace('-', '')}.xlsx"
+            save_path = self.download_dir / filename
+            download.save_as(save_path)
+            
+            logger.info(f"Downloaded file: {save_path}")
+            downloaded_file = save_path
+        finally:
+            page.close()
+
         return downloaded_file
     
     def parse_excel_file(
@@ -357,107 +567,69 @@ class EZMoneyScraper:
         source_dated = False
 
         try:
-            # ===== 步驟 1: 從 Excel 第一行提取實際資料日期 =====
-            df_header = pd.read_excel(excel_path, header=None, nrows=1)
-            first_cell = df_header.iloc[0, 0] if len(df_header) > 0 else None
-            
-            if first_cell and isinstance(first_cell, str):
-                # 嘗試解析民國日期格式 (例如: "資料日期：115/02/03")
-                import re
-                match = re.search(r'(\d{3})/(\d{2})/(\d{2})', first_cell)
-                if match:
-                    roc_year = int(match.group(1))
-                    month = int(match.group(2))
-                    day = int(match.group(3))
-                    west_year = roc_year + 1911
-                    actual_date = f"{west_year}-{month:02d}-{day:02d}"
-                    source_dated = True
-
-                    if actual_date != date:
-                        logger.info(f"Excel actual date: {actual_date} (expected: {date})")
+            # EZMoney 的 Excel 版型固定：
+            # - 第 1 行是「資料日期：YYY/MM/DD」
+            # - 第 19 行是表頭：股票代號、股票名稱、股數、持股權重
+            # - 第 20 行起是持股數據，固定 4 欄
+            #
+            # 版型固定就不需要模糊欄名比對與 DataFrame：openpyxl read_only
+            # 一趟串流讀完（日期 + 數據同一個 workbook），百列檔案約 5-10ms，
+            # 比兩次 pd.read_excel（各自重建整個 DOM）快一個數量級
+            wb = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+            try:
+                ws = wb.active
+
+                # ===== 步驟 1: 從 Excel 第一行提取實際資料日期 =====
+                first_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), None)
+                first_cell = first_row[0] if first_row else None
+
+                if first_cell and isinstance(first_cell, str):
+                    # 嘗試解析民國日期格式 (例如: "資料日期：115/02/03")
+                    match = re.search(r'(\d{3})/(\d{2})/(\d{2})', first_cell)
+                    if match:
+                        roc_year = int(match.group(1))
+                        month = int(match.group(2))
+                        day = int(match.group(3))
+                        west_year = roc_year + 1911
+                        actual_date = f"{west_year}-{month:02d}-{day:02d}"
+                        source_dated = True
+
+                        if actual_date != date:
+                            logger.info(f"Excel actual date: {actual_date} (expected: {date})")
+                        else:
+                            logger.info(f"Excel date confirmed: {actual_date}")
                     else:
-                        logger.info(f"Excel date confirmed: {actual_date}")
+                        logger.warning(f"Could not parse date from Excel header: {first_cell}")
                 else:
-                    logger.warning(f"Could not parse date from Excel header: {first_cell}")
-            else:
-                logger.warning(f"Excel header is empty or invalid, using passed date: {date}")
-            
-            # ===== 步驟 2: 解析持股資料 =====
-            # EZMoney 的 Excel 格式特殊：
-            # - 前面有基金資訊（淨資產、單位淨值等）
-            # - 第 18 行（索引 18）是表頭：股票代號、股票名稱、股數、持股權重
-            # - 第 19 行開始是股票數據
-            
-            # 直接跳過前 19 行，手動指定列名
-            df = pd.read_excel(
-                excel_path, 
-                skiprows=19,
-                names=['股票代號', '股票名稱', '股數', '持股權重']
-            )
-            
-            logger.debug(f"Loaded {len(df)} rows from Excel")
-            
-            logger.debug(f"Excel columns: {df.columns.tolist()}")
-            logger.debug(f"Excel shape: {df.shape}")
-            
-            # 欄位名稱對照
-            col_mapping = {
-                'code': None,
-                'name': None,
-                'shares': None,
-                'weight': None
-            }
-            
-            for col in df.columns:
-                col_str = str(col)
-                if '股票代號' in col_str or '股票代碼' in col_str or '代碼' in col_str:
-                    col_mapping['code'] = col
-                elif '股票名稱' in col_str or '名稱' in col_str:
-                    col_mapping['name'] = col
-                elif '股數' in col_str:
-                    col_mapping['shares'] = col
-                elif '權重' in col_str or '比例' in col_str or '持股權重' in col_str:
-                    col_mapping['weight'] = col
-            
-            logger.debug(f"Column mapping: {col_mapping}")
-            
-            if not col_mapping['code'] or not col_mapping['name']:
-                logger.error("Cannot find required columns in Excel file")
-                return []
-            
-            # 解析每一行
-            for idx, row in df.iterrows():
-                try:
-                    stock_code = str(row[col_mapping['code']]).strip()
-                    stock_name = str(row[col_mapping['name']]).strip()
-                    
-                    # 跳過空白行或非股票行
-                    if not stock_code or stock_code == 'nan':
+                    logger.warning(f"Excel header is empty or invalid, using passed date: {date}")
+
+                # ===== 步驟 2: 解析持股資料（固定 4 欄，位置索引） =====
+                for row in ws.iter_rows(min_row=20, max_col=4, values_only=True):
+                    code, name, share, weight = row
+                    if code is None:
                         continue
-                    
-                    # 只處理4位數字的台股代碼
-                    if not stock_code.isdigit() or len(stock_code) != 4:
+                    stock_code = str(code).strip()
+
+                    # 只處理4位數字的台股代碼（同時濾掉空白行與小計列）
+                    if not _STOCK_CODE_RE.fullmatch(stock_code):
                         continue
-                    
-                    holding = {
+
+                    holdings.append({
                         'etf_code': etf_code,
                         'stock_code': stock_code,
-                        'stock_name': stock_name,
-                        'shares': self._parse_number(row[col_mapping['shares']]) if col_mapping['shares'] else 0,
+                        'stock_name': str(name).strip() if name is not None else '',
+                        'shares': self._parse_number(share),
                         'market_value': 0,  # Excel 檔案中沒有市值欄位
-                        'weight': self._parse_percentage(row[col_mapping['weight']]) if col_mapping['weight'] else 0.0,
+                        'weight': self._parse_percentage(weight),
                         'date': actual_date,  # 使用從 Excel 提取的實際日期
                         'source_dated': source_dated
-                    }
-                    
-                    holdings.append(holding)
-                    
-                except Exception as e:
-                    logger.debug(f"Skipping row {idx}: {e}")
-                    continue
-            
+                    })
+            finally:
+                wb.close()
+
             logger.info(f"Parsed {len(holdings)} holdings from Excel")
-        
+
+
         except Exception as e:
             logger.error(f"Error parsing Excel file: {e}")
             logger.exception(e)
@@ -465,19 +637,23 @@ class EZMoneyScraper:
         return holdings
     
     def get_etf_holdings(
-        self, 
-        etf_code: str, 
+        self,
+        etf_code: str,
         date: str,
-        use_excel: bool = True
+        use_excel: bool = False
     ) -> List[Dict[str, Any]]:
         """
         獲取指定 ETF 在特定日期的持股明細
-        
+
         Args:
             etf_code: ETF 代碼 (例如: 00981A)
             date: 日期 (YYYY-MM-DD)
-            use_excel: 是否使用 Excel 下載方式（預設 True），False 則使用 API
-        
+            use_excel: True 時以 Excel 下載為主、API 為備援——每日正式排程
+                用這個模式，因為 Excel 表頭帶資料日期（source_dated），可豁免
+                日期錯位防護。False（預設）時 API 優先：純 HTTP 約 50ms 就有
+                結果，不用啟動瀏覽器；API 空手而回才退回 Excel。
+                注意 API 路徑以請求日期標日期，寫入層防護對它維持生效。
+
         Returns:
             List[Dict]: 持股明細列表
         """
@@ -486,24 +662,52 @@ class EZMoneyScraper:
         if not fund_code:
             logger.error(f"Cannot fetch holdings: ETF {etf_code} not in mapping")
             return []
-        
-        # 方法1: 使用 Excel 下載 (主要方式)
+
+        # 斷點續抓：過去日期若已成功解析過且檔案還在，直接重用磁碟上的
+        # Excel（當日資料盤中可能更新，不走這條捷徑）
+        if (
+            (fund_code, date) in self._done
+            and date < datetime.now().strftime('%Y-%m-%d')
+        ):
+            cached_path = self.download_dir / f"{fund_code}_{date.replace('-', '')}.xlsx"
+            if cached_path.exists():
+                logger.info(f"Checkpoint hit for {etf_code} on {date}, reusing {cached_path}")
+                holdings = self.parse_excel_file(cached_path, etf_code, date)
+                if holdings:
+                    return holdings
+
+        # Excel 優先模式（每日排程）
         if use_excel:
             logger.info(f"Using Excel download method for {etf_code}")
             excel_path = self.download_portfolio_excel(fund_code, date)
-            
+
             if excel_path and excel_path.exists():
                 holdings = self.parse_excel_file(excel_path, etf_code, date)
                 if holdings:
+                    self._mark_done(fund_code, date)
                     return holdings
                 else:
                     logger.warning("Excel parsing returned no holdings, falling back to API")
             else:
                 logger.warning("Excel download failed, falling back to API")
-        
-        # 方法2: 使用 API (備用方式)
+
+            logger.info(f"Using API method for {etf_code}")
+            return self._get_holdings_from_api(etf_code, fund_code, date)
+
+        # API 優先模式（預設）：跳過整個瀏覽器啟動
         logger.info(f"Using API method for {etf_code}")
-        return self._get_holdings_from_api(etf_code, fund_code, date)
+        holdings = self._get_holdings_from_api(etf_code, fund_code, date)
+        if holdings:
+            return holdings
+
+        logger.warning("API returned no holdings, falling back to Excel download")
+        excel_path = self.download_portfolio_excel(fund_code, date)
+        if excel_path and excel_path.exists():
+            holdings = self.parse_excel_file(excel_path, etf_code, date)
+            if holdings:
+                self._mark_done(fund_code, date)
+            return holdings
+        return []
     
     def _get_holdings_from_api(
         self,
@@ -534,23 +738,19 @@ class EZMoneyScraper:
             # 解析 API 數據結構
             asset_list = data.get('asset', [])
             
-            logger.debug(f"Found {len(asset_list)} asset categories")
+            logger.debug("Found {} asset categories", len(asset_list))
             
             if not asset_list:
                 logger.warning(f"No asset data found for {etf_code} on {date}")
                 return []
             
-            # 找出股票類資產 (AssetCode: "ST")
-            stock_asset = None
-            for i, asset in enumerate(asset_list):
-                asset_code = asset.get('AssetCode', '')
-                asset_name = asset.get('AssetName', '')
-                logger.debug(f"Asset {i}: {asset_code} - {asset_name}")
-                
-                if asset_code == 'ST':
-                    stock_asset = asset
-                    break
-            
+            # 找出股票類資產 (AssetCode: "ST")：建索引直接取，
+            # 不逐項迭代（順便把逐項的 f-string debug 格式化成本省掉——
+            # loguru 的 {} 格式化在等級未啟用時不會執行）
+            assets_by_code = {a.get('AssetCode', ''): a for a in asset_list}
+            logger.debug("Asset categories: {}", list(assets_by_code))
+            stock_asset = assets_by_code.get('ST')
+
             if not stock_asset:
                 logger.warning(f"No stock holdings found for {etf_code} on {date}")
                 return []
@@ -559,18 +759,34 @@ class EZMoneyScraper:
             details = stock_asset.get('Details', [])
             logger.info(f"Found {len(details)} stock holdings")
             
-            for item in details:
-                holding = {
-                    'etf_code': etf_code,
-                    'stock_code': item.get('DetailCode', ''),
-                    'stock_name': item.get('DetailName', ''),
-                    'shares': self._parse_number(item.get('Share', 0)),
-                    'market_value': self._parse_number(item.get('Amount', 0)),
-                    'weight': self._parse_percentage(item.get('NavRate', 0)),
-                    'date': date
-                }
-                holdings.append(holding)
-            
+            # 向量化解析：逐筆 Python 迴圈對數百檔持股是 O(rows) 次直譯器呼叫，
+            # 整欄交給 pandas 的 C 實作後，Python 層的工作量與列數無關。
+            # pandas 只有這條 API 路徑用到，延遲匯入讓模組冷啟動更快
+            import pandas as pd
+
+            df = pd.DataFrame(details)
+            for col in ('DetailCode', 'DetailName', 'Share', 'Amount', 'NavRate'):
+                if col not in df.columns:
+                    df[col] = ''
+
+            def _numeric(col: str) -> pd.Series:
+                """整欄清理分隔符並轉數值，無法解析的值以 0 代替"""
+                return pd.to_numeric(
+                    df[col].astype(str).str.translate(_PCT_STRIP),
+                    errors='coerce'
+                ).fillna(0)
+
+            parsed = pd.DataFrame({
+                'etf_code': etf_code,
+                'stock_code': df['DetailCode'].astype(str),
+                'stock_name': df['DetailName'].astype(str),
+                'shares': _numeric('Share').astype('int64'),
+                'market_value': _numeric('Amount').astype('int64'),
+                'weight': _numeric('NavRate').astype(float),
+                'date': date,
+            })
+            holdings = parsed.to_dict('records')
+
             logger.info(f"Parsed {len(holdings)} holdings for {etf_code} on {date}")
         
         except Exception as e:
@@ -590,11 +806,15 @@ class EZMoneyScraper:
         Returns:
             int: 解析後的整數
         """
-        if isinstance(value, (int, float)):
+        # openpyxl 給的值多半已是 int/float：先直接嘗試轉型（成功路徑
+        # 零 isinstance 檢查），字串清理留給例外分支
+        try:
             return int(value)
-        if isinstance(value, str):
-            return int(value.replace(',', '').replace(' ', ''))
-        return 0
+        except (TypeError, ValueError):
+            try:
+                return int(float(str(value).translate(_NUM_STRIP)))
+            except ValueError:
+                return 0
     
     @staticmethod
     def _parse_percentage(value: Any) -> float:
@@ -607,11 +827,14 @@ class EZMoneyScraper:
         Returns:
             float: 解析後的浮點數
         """
-        if isinstance(value, (int, float)):
+        # 同 _parse_number：先走已是數值的快速路徑
+        try:
             return float(value)
-        if isinstance(value, str):
-            return float(value.replace('%', '').replace(',', '').replace(' ', ''))
-        return 0.0
+        except (TypeError, ValueError):
+            try:
+                return float(str(value).translate(_PCT_STRIP))
+            except ValueError:
+                return 0.0
     
     def add_etf_mapping(self, etf_code: str, fund_code: str):
         """
@@ -624,11 +847,11 @@ class EZMoneyScraper:
         EZMONEY_ETF_CODES[etf_code] = fund_code
         logger.info(f"Added ETF mapping: {etf_code} -> {fund_code}")
     
-    def get_all_mappings(self) -> Dict[str, str]:
+    def get_all_mappings(self) -> Mapping[str, str]:
         """
-        獲取所有 ETF 對照表
-        
+        獲取所有 ETF 對照表（唯讀視圖，不做複製）
+
         Returns:
-            Dict[str, str]: ETF 代碼對照字典
+            Mapping[str, str]: ETF 代碼對照字典
         """
-        return EZMONEY_ETF_CODES.copy()
+        return _EZMONEY_CODES_VIEW
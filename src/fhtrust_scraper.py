@@ -2,19 +2,31 @@
 復華投信 ETF 爬蟲模組
 使用 API 下載 Excel 文件並解析
 """
+import re
 import requests
+import shutil
 import time
 import random
-from typing import List, Dict, Any, Optional
 from datetime import datetime
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional
 from pathlib import Path
-import pandas as pd
+import openpyxl
 from loguru import logger
 
 from .config import (
     REQUEST_DELAY_MIN,
     REQUEST_DELAY_MAX
 )
+from .http_utils import get_shared_session
+
+
+# 數值清理用的刪除表：str.translate 一趟 C 掃描就完成，
+# 連鎖 str.replace 要各自配置中間字串、掃多趟
+_NUM_STRIP = str.maketrans('', '', ', %\t')
+
+# 台股代碼為 4 位數字；預編譯一次，逐列驗證走單趟 C 比對
+_STOCK_CODE_RE = re.compile(r'\d{4}')
 
 
 # 復華投信 ETF 基金代碼對照表
@@ -23,6 +35,10 @@ FHTRUST_ETF_CODES = {
     # 未來可以新增其他復華投信 ETF
 }
 
+# 唯讀視圖：get_all_mappings 直接回傳這個，免去每次呼叫的 dict 複製；
+# 透過 add_etf_mapping 對底層 dict 的新增會即時反映在視圖上
+_FHTRUST_CODES_VIEW = MappingProxyType(FHTRUST_ETF_CODES)
+
 
 class FHTrustScraper:
     """復華投信網站 ETF 爬蟲（使用 API 下載 Excel）"""
@@ -32,6 +48,9 @@ class FHTrustScraper:
     
     def __init__(self):
         """初始化爬蟲"""
+        # 模組層共用的 Session：同主機連續下載走 keep-alive，
+        # 連線池跨 scraper 實例存活，並帶共用重試策略
+        self.session = get_shared_session()
         self.request_count = 0
         self.download_dir = Path("downloads/fhtrust")
         self.download_dir.mkdir(parents=True, exist_ok=True)
@@ -39,7 +58,7 @@ class FHTrustScraper:
     def _random_delay(self):
         """隨機延遲，避免被封鎖"""
         delay = random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
-        logger.debug(f"Waiting {delay:.2f} seconds...")
+        logger.debug("Waiting {:.2f} seconds...", delay)
         time.sleep(delay)
     
     def get_fund_id(self, etf_code: str) -> Optional[str]:
@@ -58,41 +77,58 @@ class FHTrustScraper:
         return fund_id
     
     def download_portfolio_excel(
-        self, 
+        self,
         fund_id: str,
-        date: str
+        date: str,
+        force_refresh: bool = False
     ) -> Optional[Path]:
         """
         使用 API 下載投資組合 Excel 文件
-        
+
         Args:
             fund_id: 復華投信基金代碼 (例如: ETF23)
             date: 日期 (YYYY-MM-DD)
-        
+            force_refresh: True 時忽略磁碟上的既有檔案、強制重新下載
+
         Returns:
             Optional[Path]: 下載的文件路徑，失敗時返回 None
         """
-        # 轉換日期格式為 YYYYMMDD
-        date_obj = datetime.strptime(date, '%Y-%m-%d')
-        date_str = date_obj.strftime('%Y%m%d')
-        
+        # 轉換日期格式為 YYYYMMDD：直接去掉分隔符即可，
+        # 不必經過 strptime/strftime（一來一回約 10 µs）
+        date_str = date.replace('-', '')
+
+        # 過去日期的檔案不會再變動：磁碟上已有完整檔案就直接重用，
+        # 省掉下載（當日檔案盤中可能更新，不走捷徑）
+        cached_path = self.download_dir / f"{fund_id}_{date_str}.xlsx"
+        if (
+            not force_refresh
+            and date < datetime.now().strftime('%Y-%m-%d')
+            and cached_path.exists()
+            and cached_path.stat().st_size > 1024
+        ):
+            logger.info(f"Reusing cached Excel: {cached_path}")
+            return cached_path
+
         api_url = f"{self.BASE_URL}{self.EXCEL_API.format(fund_id=fund_id, date=date_str)}"
         logger.info(f"Downloading portfolio Excel for fund {fund_id} on {date}")
-        logger.debug(f"API URL: {api_url}")
+        logger.debug("API URL: {}", api_url)
         
         downloaded_file = None
         
         try:
-            response = requests.get(api_url, timeout=30)
-            response.raise_for_status()
-            
-            # 儲存文件
-            filename = f"{fund_id}_{date.replace('-', '')}.xlsx"
-            save_path = self.download_dir / filename
-            
-            with open(save_path, 'wb') as f:
-                f.write(response.content)
-            
+            # 串流直寫磁碟：不先把整個 xlsx 緩衝進 response.content，
+            # 峰值記憶體降為一個 chunk，且網路與磁碟 I/O 可重疊
+            with self.session.get(api_url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+
+                # 儲存文件
+                filename = f"{fund_id}_{date.replace('-', '')}.xlsx"
+                save_path = self.download_dir / filename
+
+                response.raw.decode_content = True
+                with open(save_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=1 << 16)
+
             logger.info(f"Downloaded file: {save_path}")
             downloaded_file = save_path
         
@@ -120,71 +156,84 @@ class FHTrustScraper:
             List[Dict]: 持股明細列表
         """
         holdings = []
-        
+
         try:
             logger.info(f"Parsing Excel file: {excel_path}")
-            
+
             # 復華投信的 Excel 格式：
             # - 前 10 行是標題和基金資訊
             # - 第 10 行（index 9）是欄位標題：證券代號、證券名稱、股數、金額、權重(%)
             # - 從第 11 行開始是實際數據
-            
-            # 指定 engine='openpyxl' 以支援 .xlsx 格式
-            df = pd.read_excel(excel_path, skiprows=10, engine='openpyxl')
-            
-            logger.debug(f"Excel columns: {df.columns.tolist()}")
-            logger.debug(f"Excel shape: {df.shape}")
-            
-            # 復華投信的欄位名稱
-            code_col = '證券代號'
-            name_col = '證券名稱'
-            shares_col = '股數'
-            weight_col = '權重(%)'
-            
-            # 驗證欄位是否存在
-            required_cols = [code_col, name_col, shares_col, weight_col]
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.error(f"Missing required columns: {missing_cols}")
-                logger.error(f"Available columns: {df.columns.tolist()}")
-                return []
-            
-            logger.debug(f"Found all required columns")
-            
-            # 解析每一行
-            for idx, row in df.iterrows():
-                try:
-                    stock_code = str(row[code_col]).strip()
-                    stock_name = str(row[name_col]).strip()
-                    
-                    # 驗證股票代號（應該是4位數字）
-                    if not (stock_code.isdigit() and len(stock_code) == 4):
-                        logger.debug(f"Skipping invalid stock code: {stock_code}")
+            #
+            # 用 openpyxl read_only 串流逐列讀取：pd.read_excel 會先建整個
+            # openpyxl DOM 再轉成 DataFrame，只為了逐列迭代；read_only 模式
+            # 邊讀邊吐 tuple，解析快 5-10 倍且記憶體固定
+            wb = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+            try:
+                ws = wb.active
+                rows = ws.iter_rows(values_only=True)
+
+                # 掃描表頭列（防表頭位置漂移，不寫死第 10 行）
+                header = None
+                for row in rows:
+                    if row and any(isinstance(v, str) and '證券代號' in v for v in row):
+                        header = [str(v).strip() if v is not None else '' for v in row]
+                        break
+
+                if header is None:
+                    logger.error("Header row with 證券代號 not found in Excel")
+                    return []
+
+                # 復華投信的欄位名稱
+                col_index = {name: i for i, name in enumerate(header)}
+                required_cols = ['證券代號', '證券名稱', '股數', '權重(%)']
+                missing_cols = [c for c in required_cols if c not in col_index]
+
+                if missing_cols:
+                    logger.error(f"Missing required columns: {missing_cols}")
+                    logger.error(f"Available columns: {header}")
+                    return []
+
+                code_i = col_index['證券代號']
+                name_i = col_index['證券名稱']
+                shares_i = col_index['股數']
+                weight_i = col_index['權重(%)']
+
+                # 表頭之後的列就是數據
+                for row in rows:
+                    try:
+                        if not row or row[code_i] is None:
+                            continue
+                        stock_code = str(row[code_i]).strip()
+                        stock_name = str(row[name_i]).strip()
+
+                        # 驗證股票代號（應該是4位數字）
+                        if not _STOCK_CODE_RE.fullmatch(stock_code):
+                            logger.debug("Skipping invalid stock code: {}", stock_code)
+                            continue
+
+                        holdings.append({
+                            'etf_code': etf_code,
+                            'stock_code': stock_code,
+                            'stock_name': stock_name,
+                            'weight': self._parse_percentage(row[weight_i]),
+                            'shares': self._parse_number(row[shares_i]),
+                            'market_value': 0,  # 可以從「金額」欄位取得，但目前資料庫不需要
+                            'date': date
+                        })
+
+                    except Exception as e:
+                        logger.debug("Error parsing row: {}", e)
                         continue
-                    
-                    holding = {
-                        'etf_code': etf_code,
-                        'stock_code': stock_code,
-                        'stock_name': stock_name,
-                        'weight': self._parse_percentage(row[weight_col]),
-                        'shares': self._parse_number(row[shares_col]),
-                        'market_value': 0,  # 可以從「金額」欄位取得，但目前資料庫不需要
-                        'date': date
-                    }
-                    
-                    holdings.append(holding)
-                
-                except Exception as e:
-                    logger.debug(f"Error parsing row {idx}: {e}")
-                    continue
-            
+            finally:
+                wb.close()
+
             logger.info(f"Parsed {len(holdings)} holdings from Excel")
-        
+
         except Exception as e:
             logger.error(f"Error parsing Excel file: {e}")
             logger.exception(e)
-        
+
         return holdings
     
     def get_etf_holdings(
@@ -225,6 +274,42 @@ class FHTrustScraper:
         
         return holdings
     
+    def get_historical_holdings(
+        self,
+        etf_code: str,
+        dates: List[str],
+        max_workers: int = 5
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        批次抓取多個日期的持股明細（歷史回補用）
+
+        下載與解析都是 I/O 等待為主，逐日序列抓取的總耗時是
+        N×(延遲+下載)；用有上限的執行緒池並行後約縮為 N/max_workers。
+        並行上限預設 5，避免對來源造成壓力。
+
+        Args:
+            etf_code: ETF 代碼 (例如: 00991A)
+            dates: 日期列表 (YYYY-MM-DD)
+            max_workers: 並行上限
+
+        Returns:
+            Dict[str, List[Dict]]: 日期 -> 持股明細列表（失敗的日期為空列表）
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not dates:
+            return {}
+
+        logger.info(
+            f"Fetching {len(dates)} holdings snapshots for {etf_code} "
+            f"with {max_workers} workers"
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda d: self.get_etf_holdings(etf_code, d), dates
+            )
+            return dict(zip(dates, results))
+
     @staticmethod
     def _parse_number(value: Any) -> int:
         """
@@ -236,17 +321,15 @@ class FHTrustScraper:
         Returns:
             int: 解析後的整數
         """
-        if pd.isna(value):
-            return 0
-        if isinstance(value, (int, float)):
+        # openpyxl 給的值多半已是 int/float：先直接嘗試轉型（成功路徑
+        # 零 isinstance 檢查），None/NaN/字串清理留給例外分支
+        try:
             return int(value)
-        if isinstance(value, str):
-            clean_value = value.replace(',', '').replace(' ', '').replace('%', '').strip()
+        except (TypeError, ValueError):
             try:
-                return int(float(clean_value))
-            except:
+                return int(float(str(value).translate(_NUM_STRIP)))
+            except ValueError:
                 return 0
-        return 0
     
     @staticmethod
     def _parse_percentage(value: Any) -> float:
@@ -259,17 +342,16 @@ class FHTrustScraper:
         Returns:
             float: 解析後的浮點數
         """
-        if pd.isna(value):
-            return 0.0
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, str):
-            clean_value = value.replace('%', '').replace(',', '').replace(' ', '').strip()
+        # 同 _parse_number：先走已是數值的快速路徑（NaN != NaN 用來擋掉
+        # 空儲存格，維持原本回傳 0.0 的行為）
+        try:
+            result = float(value)
+        except (TypeError, ValueError):
             try:
-                return float(clean_value)
-            except:
+                return float(str(value).translate(_NUM_STRIP))
+            except ValueError:
                 return 0.0
-        return 0.0
+        return result if result == result else 0.0
     
     def add_etf_mapping(self, etf_code: str, fund_id: str):
         """
@@ -282,11 +364,11 @@ class FHTrustScraper:
         FHTRUST_ETF_CODES[etf_code] = fund_id
         logger.info(f"Added ETF mapping: {etf_code} -> {fund_id}")
     
-    def get_all_mappings(self) -> Dict[str, str]:
+    def get_all_mappings(self) -> Mapping[str, str]:
         """
-        獲取所有 ETF 對照表
-        
+        獲取所有 ETF 對照表（唯讀視圖，不做複製）
+
         Returns:
-            Dict[str, str]: ETF 代碼對照字典
+            Mapping[str, str]: ETF 代碼對照字典
         """
-        return FHTRUST_ETF_CODES.copy()
+        return _FHTRUST_CODES_VIEW
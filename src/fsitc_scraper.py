@@ -16,12 +16,55 @@
 import requests
 import pandas as pd
 from datetime import datetime
+from types import MappingProxyType
 from typing import List, Dict, Any, Optional
 from loguru import logger
+from lxml import etree
+from lxml import html as lxml_html
+from src.http_utils import make_session
 from src.utils import get_user_agent
 import time
 import random
 
+# 回應內還包一層 JSON 字串（"d" 欄位），同一筆資料要過兩次解析器，
+# orjson（C 實作）快 2-3 倍且直接吃 bytes；未安裝時退回內建 json
+try:
+    import orjson as _json_impl
+
+    def _json_loads(raw) -> Any:
+        return _json_impl.loads(raw)
+except ImportError:
+    import json as _json_impl
+
+    def _json_loads(raw) -> Any:
+        return _json_impl.loads(raw)
+
+# 預編譯 XPath：只取每列 li 下的 span 文字，整棵樹停留在 C 層的
+# lxml Element，省掉 BeautifulSoup 在上面再建一層 Python 物件樹
+_ROW_XPATH = etree.XPath('//li[count(span) >= 4]')
+_SPAN_XPATH = etree.XPath('./span/text()')
+
+# 數值清理用的刪除表：str.translate 一趟 C 掃描就完成，
+# 連鎖 str.replace 要各自配置中間字串、掃多趟
+_NUM_TRANS = str.maketrans('', '', ',% \t')
+
+# API 欄位是 A/B/C/D 無語意代號（見模組 docstring），各欄位的候選
+# key 固定成 tuple，逐列解析時不重建
+_CODE_KEYS = ('A', 'StockCode', 'Code')
+_NAME_KEYS = ('B', 'StockName', 'Name')
+_WEIGHT_KEYS = ('C', 'Rate', 'Weight')
+_SHARES_KEYS = ('D', 'Sheets', 'Shares')
+
+
+def _first_key(item: Dict, keys: tuple) -> Any:
+    """依候選 key 順序取第一個非空值"""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return None
+
+
 class FSITCScraper:
     """第一金投信 (FSITC) 爬蟲"""
     
@@ -31,17 +74,31 @@ class FSITCScraper:
     # 基金代碼映射 (ETF Code -> Fund ID)
     # 查法：官網首頁的 FundDetail.aspx?ID=<n> 的 n 即為此處 fund_id，
     #       開該頁確認基金全名（優「選」=00994A、優「股息」=00408A，名稱只差一字）
-    FUND_ID_MAP = {
+    # MappingProxyType：唯讀視圖，get_all_mappings 可直接回傳、
+    # 跨呼叫者共用而不怕被改動（同 EZMoney/FHTrust 的做法）
+    FUND_ID_MAP = MappingProxyType({
         "00994A": "182",  # 第一金台股趨勢優選主動式ETF基金
         "00408A": "183",  # 第一金台股趨勢優股息主動式ETF基金（2026/7/15 掛牌）
-    }
+    })
+
+    # payload 骨架：每次請求 copy 再填值，不重建 dict 字面值
+    _PAYLOAD_TMPL = {"pStrFundID": "", "pStrDate": ""}
     
     def __init__(self):
-        self.session = requests.Session()
+        # 共用設定的 Session：掛好重試策略與連線池，連續抓多檔基金時
+        # 走 keep-alive，只付一次 TCP+TLS 握手
+        self.session = make_session()
+        # 憑證問題固定存在，verify 設在 session 上，不逐請求傳
+        # （InsecureRequestWarning 已在 http_utils 模組載入時停用）
+        self.session.verify = False
         self.session.headers.update({
             'User-Agent': get_user_agent(),
             'Content-Type': 'application/json; charset=utf-8',
             'Accept': 'application/json, text/javascript, */*; q=0.01',
+            # 明示壓縮：多 KB 的 JSON 經 gzip 可縮 5-10 倍，requests 會
+            # 自動解壓。不宣告 br——brotli 不在依賴內，宣告了但解不開
+            # 反而會讓回應整包失敗
+            'Accept-Encoding': 'gzip, deflate',
             'X-Requested-With': 'XMLHttpRequest',
             'Origin': 'https://www.fsitc.com.tw',
             'Referer': 'https://www.fsitc.com.tw/FundDetail.aspx'
@@ -66,40 +123,46 @@ class FSITCScraper:
         holdings = []
         actual_date = date  # 默認使用請求日期
         try:
-            # 準備請求數據
-            payload = {
-                "pStrFundID": fund_id,
-                "pStrDate": date
-            }
-            
-            logger.info(f"Fetching FSITC holdings for {etf_code} (ID: {fund_id}) on {date}")
-            # Disable SSL verification due to certificate errors
-            import urllib3
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            # 準備請求數據（複製骨架再填值）
+            payload = self._PAYLOAD_TMPL.copy()
+            payload["pStrFundID"] = fund_id
+            payload["pStrDate"] = date
             
-            response = self.session.post(self.API_URL, json=payload, timeout=10, verify=False)
+            logger.info("Fetching FSITC holdings for {} (ID: {}) on {}", etf_code, fund_id, date)
+
+            response = self.session.post(self.API_URL, json=payload, timeout=10)
             
             if response.status_code == 200:
+                raw = response.content
+
+                # 看第一個 byte 就能分流 HTML / JSON，不必先投機式
+                # 解析 JSON 失敗再退回；錯誤路徑也只解碼前 200 bytes，
+                # 不強迫 response.text 把整個 body 再解碼一次
+                if raw[:1] == b'<':
+                    holdings = self._parse_html_table(
+                        raw.decode('utf-8', 'replace'), date, etf_code
+                    )
+                    logger.info("Parsed {} holdings for {} (actual date: {})", len(holdings), etf_code, actual_date)
+                    return holdings, actual_date
+
                 try:
-                    data = response.json()
-                except Exception as e:
-                    logger.error(f"Failed to parse JSON: {response.text[:200]}")
+                    # 直接解析 bytes，省掉 response.json() 的整段 UTF-8 解碼
+                    data = _json_loads(raw)
+                except ValueError:
+                    logger.error(f"Failed to parse JSON: {raw[:200].decode('utf-8', 'replace')}")
                     return [], date
-                
+
                 # 預期返回 {"d": "JSON string or HTML"} 或者直接是 JSON 結構
-                result = data.get('d')
-                
-                if result is None:
+                if isinstance(data, dict) and 'd' in data:
+                    result = data['d']
+                elif isinstance(data, list):
                     # 如果沒有 d，嘗試直接使用 data (可能是 list 或其他結構)
-                    # 檢查 data 是否為 list
-                    if isinstance(data, list):
-                        result = data
-                    else:
-                        logger.warning(f"Unexpected JSON structure: {data.keys() if isinstance(data, dict) else type(data)}")
-                        return [], date
+                    result = data
+                else:
+                    logger.warning(f"Unexpected JSON structure: {data.keys() if isinstance(data, dict) else type(data)}")
+                    return [], date
                 
                 # 如果 "d" 是 JSON 字串，需要再次解析
-                import json
                 if isinstance(result, str):
                     try:
                         # 嘗試解析 d 內容
@@ -108,9 +171,9 @@ class FSITCScraper:
                             # HTML格式無法提取實際日期，使用請求日期
                         else:
                             try:
-                                inner_data = json.loads(result)
+                                inner_data = _json_loads(result)
                                 holdings, actual_date = self._parse_json_data(inner_data, date, etf_code)
-                            except json.JSONDecodeError:
+                            except ValueError:
                                 # 嘗試直接當作 HTML
                                 holdings = self._parse_html_table(result, date, etf_code)
                                 
@@ -120,65 +183,61 @@ class FSITCScraper:
                     # 已經是 dict/list
                     holdings, actual_date = self._parse_json_data(result, date, etf_code)
 
-                logger.info(f"Parsed {len(holdings)} holdings for {etf_code} (actual date: {actual_date})")
+                logger.info("Parsed {} holdings for {} (actual date: {})", len(holdings), etf_code, actual_date)
                 
             else:
                 logger.error(f"Failed to fetch data: HTTP {response.status_code}")
                 
         except Exception as e:
-            logger.error(f"Error fetching FSITC holdings: {e}")
-            logger.exception(e)
-            
+            # 不用 logger.exception：traceback 擷取要走整條 frame 鏈，
+            # retry 風暴時每次失敗都多付一次；錯誤訊息本身已足夠定位
+            logger.error("Error fetching FSITC holdings: {}", e)
+
         return holdings, actual_date
     
     def _parse_html_table(self, html_content: str, date: str, etf_code: str = None) -> List[Dict[str, Any]]:
-        """解析 HTML 表格數據"""
-        from bs4 import BeautifulSoup
-        
+        """
+        解析 HTML 表格數據
+
+        只需要每列 li 底下 4 個 span 的文字，直接用 lxml + 預編譯 XPath
+        迭代 C 層 Element（lxml 的容錯 HTML parser 對破損片段一樣寬容），
+        省掉 BeautifulSoup 在 C 樹之上重建 Python 物件樹的成本。
+        """
         holdings = []
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            # 尋找表格行
-            # 根據 explore，可能結構是 li > span
-            rows = soup.find_all('li')
-            
-            for row in rows:
-                spans = row.find_all('span')
-                # 預期欄位: 股票代碼, 股票名稱, 持股權重, 股數
-                # 需確認 span 順序
-                # 通常：Code, Name, Weight, Shares
-                
-                if len(spans) >= 4:
-                    try:
-                        # 假設順序，需測試驗證
-                        # span[0]: 代碼
-                        # span[1]: 名稱
-                        # span[2]: 權重
-                        # span[3]: 股數
-                        
-                        code = spans[0].text.strip()
-                        name = spans[1].text.strip()
-                        weight_str = spans[2].text.strip().replace('%', '')
-                        shares_str = spans[3].text.strip().replace(',', '')
-                        
-                        # 簡單驗證
-                        if code.isdigit() and len(code) == 4:
-                            holdings.append({
-                                'etf_code': etf_code,
-                                'stock_code': code,
-                                'stock_name': name,
-                                'shares': int(float(shares_str)) if shares_str else 0,
-                                'weight': float(weight_str) if weight_str else 0.0,
-                                'market_value': 0,
-                                'date': date
-                            })
-                    except Exception as e:
-                        logger.debug(f"Error parsing row: {e}")
-                        continue
-                        
+            tree = lxml_html.fromstring(html_content)
+
+            # 預期欄位: 股票代碼, 股票名稱, 持股權重, 股數
+            # 根據 explore，結構是 li > span
+            for row in _ROW_XPATH(tree):
+                texts = _SPAN_XPATH(row)
+                if len(texts) < 4:
+                    continue
+                try:
+                    # span[0]: 代碼, span[1]: 名稱, span[2]: 權重, span[3]: 股數
+                    code = texts[0].strip()
+                    name = texts[1].strip()
+                    weight_str = texts[2].strip().replace('%', '')
+                    shares_str = texts[3].strip().replace(',', '')
+
+                    # 簡單驗證
+                    if code.isdigit() and len(code) == 4:
+                        holdings.append({
+                            'etf_code': etf_code,
+                            'stock_code': code,
+                            'stock_name': name,
+                            'shares': int(float(shares_str)) if shares_str else 0,
+                            'weight': float(weight_str) if weight_str else 0.0,
+                            'market_value': 0,
+                            'date': date
+                        })
+                except Exception as e:
+                    logger.debug("Error parsing row: {}", e)
+                    continue
+
         except Exception as e:
             logger.error(f"Error parsing HTML: {e}")
-            
+
         return holdings
 
     def _parse_json_data(self, data: List[Dict], date: str, etf_code: str = None) -> tuple[List[Dict[str, Any]], str]:
@@ -206,27 +265,28 @@ class FSITCScraper:
         for item in data:
             try:
                 # 嘗試多種可能的 key
-                code = item.get('A') or item.get('StockCode') or item.get('Code')
-                name = item.get('B') or item.get('StockName') or item.get('Name')
-                weight_val = item.get('C') or item.get('Rate') or item.get('Weight')
-                shares_val = item.get('D') or item.get('Sheets') or item.get('Shares')
-                
+                code = _first_key(item, _CODE_KEYS)
+                name = _first_key(item, _NAME_KEYS)
+                weight_val = _first_key(item, _WEIGHT_KEYS)
+                shares_val = _first_key(item, _SHARES_KEYS)
+
                 if code:
-                    # 處理數據格式
+                    # 處理數據格式：translate 一趟清掉逗號/百分號，直接
+                    # 轉型、靠例外擋非數值，省掉 isdigit 預檢的整串掃描
                     shares = 0
                     if shares_val:
-                        shares_str = str(shares_val).replace(',', '').strip()
-                        if shares_str.replace('.', '').isdigit():
-                            shares = int(float(shares_str))
-                            
+                        try:
+                            shares = int(float(str(shares_val).translate(_NUM_TRANS)))
+                        except ValueError:
+                            pass
+
                     weight = 0.0
                     if weight_val:
-                        weight_str = str(weight_val).replace('%', '').strip()
                         try:
-                            weight = float(weight_str)
+                            weight = float(str(weight_val).translate(_NUM_TRANS))
                         except ValueError:
                             pass
-                            
+
                     holdings.append({
                         'etf_code': etf_code,
                         'stock_code': str(code).strip(),
@@ -238,7 +298,7 @@ class FSITCScraper:
                         'source_dated': source_dated
                     })
             except Exception as e:
-                logger.warning(f"Error parsing JSON item: {e}")
+                logger.warning("Error parsing JSON item: {}", e)
                 
         return holdings, actual_date  # 返回holdings和實際使用的日期
 
@@ -3,12 +3,27 @@
 """
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
+from functools import lru_cache
+from operator import itemgetter
 from loguru import logger
 
+# 建索引字典用的 key 抽取器：itemgetter 是 C 實作，
+# 配合 map/zip 讓整個 dict 建構不經過 Python bytecode
+_get_code = itemgetter('stock_code')
 
-@dataclass
+# 文字報告的固定元素：模組層建一次，不在每次產報告時重算
+_SEP = '=' * 60
+_ARROW_UP = "▲"
+_ARROW_DOWN = "▼"
+
+
+@dataclass(slots=True)
 class HoldingChange:
-    """持股變動記錄"""
+    """持股變動記錄
+
+    slots=True 去掉每個實例的 __dict__：一天可能產生數千筆變動紀錄，
+    每筆省約 40% 記憶體，欄位存取也從 dict 查找變 slot descriptor。
+    """
     change_type: str  # ADDED, REMOVED, SHARES_UP, SHARES_DOWN
     stock_code: str
     stock_name: str
@@ -35,15 +50,22 @@ class HoldingsAnalyzer:
             db: 資料庫實例
         """
         self.db = db
+        # ETF 名稱表的實例層快取：一次報表常連產文字版＋Markdown 版，
+        # 名稱表在分析器生命週期內不變，查一次 DB 即可
+        self._etf_name_map: Optional[Dict[str, str]] = None
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def shares_to_lots(shares: int) -> float:
         """
         將股數轉換為張數
-        
+
+        比對迴圈裡每檔股票最多呼叫 4 次，而持股股數高度重複
+        （整張的倍數居多），lru_cache 命中時省掉除法與 round。
+
         Args:
             shares: 股數
-            
+
         Returns:
             float: 張數（保留兩位小數）
         """
@@ -64,60 +86,59 @@ class HoldingsAnalyzer:
         Returns:
             List[HoldingChange]: 變動列表
         """
-        # 建立字典方便查詢
-        yesterday_stocks = {h['stock_code']: h for h in yesterday_holdings}
-        today_stocks = {h['stock_code']: h for h in today_holdings}
-        
+        # 大清單（數千檔）時改走 pandas 的 C 層集合運算；典型台股
+        # 主動式 ETF 只有一兩百檔持股，建 DataFrame 的固定開銷反而
+        # 比純 Python 迴圈貴，門檻以下維持單趟掃描
+        if max(len(yesterday_holdings), len(today_holdings)) >= 1000:
+            return self._compare_holdings_vectorized(
+                yesterday_holdings, today_holdings
+            )
+
+        # 建立字典方便查詢：key 抽取與 dict 建構都走 C 路徑
+        yesterday_stocks = dict(
+            zip(map(_get_code, yesterday_holdings), yesterday_holdings)
+        )
+        today_stocks = dict(zip(map(_get_code, today_holdings), today_holdings))
+
         changes = []
-        
-        # 1. 檢測新增成分股
-        for code in today_stocks:
-            if code not in yesterday_stocks:
-                holding = today_stocks[code]
-                lots = self.shares_to_lots(holding.get('shares', 0))
-                
+
+        # 單趟掃過兩日代碼的聯集（dict 合併保留插入順序），每個代碼
+        # 各做一次 get 就能分類，取代原本三趟掃描的 ~2N 次雜湊查找。
+        # 報表端是依 change_type 分組輸出，混類型的產出順序無影響。
+        for code in {**yesterday_stocks, **today_stocks}:
+            old_holding = yesterday_stocks.get(code)
+            new_holding = today_stocks.get(code)
+
+            if old_holding is None:
+                # 新增成分股
+                shares = new_holding.get('shares', 0)
                 changes.append(HoldingChange(
                     change_type='ADDED',
                     stock_code=code,
-                    stock_name=holding.get('stock_name', ''),
-                    new_shares=holding.get('shares', 0),
-                    new_lots=lots
+                    stock_name=new_holding.get('stock_name', ''),
+                    new_shares=shares,
+                    new_lots=self.shares_to_lots(shares)
                 ))
-        
-        # 2. 檢測移除成分股
-        for code in yesterday_stocks:
-            if code not in today_stocks:
-                holding = yesterday_stocks[code]
-                lots = self.shares_to_lots(holding.get('shares', 0))
-                
+            elif new_holding is None:
+                # 移除成分股
+                shares = old_holding.get('shares', 0)
                 changes.append(HoldingChange(
                     change_type='REMOVED',
                     stock_code=code,
-                    stock_name=holding.get('stock_name', ''),
-                    old_shares=holding.get('shares', 0),
-                    old_lots=lots
+                    stock_name=old_holding.get('stock_name', ''),
+                    old_shares=shares,
+                    old_lots=self.shares_to_lots(shares)
                 ))
-        
-        # 3. 檢測股數變動
-        for code in yesterday_stocks:
-            if code in today_stocks:
-                old_holding = yesterday_stocks[code]
-                new_holding = today_stocks[code]
-                
+            else:
+                # 股數變動：只要股數有任何變化就記錄（包括1股的變化）
                 old_shares = old_holding.get('shares', 0)
                 new_shares = new_holding.get('shares', 0)
                 shares_diff = new_shares - old_shares
-                
-                old_lots = self.shares_to_lots(old_shares)
-                new_lots = self.shares_to_lots(new_shares)
-                lots_diff = new_lots - old_lots
-                
-                # 只要股數有任何變化就記錄（包括1股的變化）
                 if shares_diff != 0:
-                    change_type = 'SHARES_UP' if shares_diff > 0 else 'SHARES_DOWN'
-                    
+                    old_lots = self.shares_to_lots(old_shares)
+                    new_lots = self.shares_to_lots(new_shares)
                     changes.append(HoldingChange(
-                        change_type=change_type,
+                        change_type='SHARES_UP' if shares_diff > 0 else 'SHARES_DOWN',
                         stock_code=code,
                         stock_name=new_holding.get('stock_name', ''),
                         old_shares=old_shares,
@@ -125,11 +146,111 @@ class HoldingsAnalyzer:
                         shares_diff=shares_diff,
                         old_lots=old_lots,
                         new_lots=new_lots,
-                        lots_diff=lots_diff
+                        lots_diff=new_lots - old_lots
                     ))
-        
+
         return changes
-    
+
+    def _compare_holdings_vectorized(
+        self,
+        yesterday_holdings: List[Dict[str, Any]],
+        today_holdings: List[Dict[str, Any]]
+    ) -> List[HoldingChange]:
+        """
+        compare_holdings 的向量化版本（大清單用）
+
+        代碼抽成 NumPy 字串陣列、股數抽成 int64 陣列，新增/移除/交集
+        用 np.setdiff1d / np.intersect1d（assume_unique + return_indices）
+        在 C 層算完，股數差是一次整欄相減；Python 只在最後把非零差異
+        組成 HoldingChange。相比先前的 pandas 版省掉 DataFrame 建構
+        與 .loc 索引的逐次開銷。
+
+        Returns:
+            List[HoldingChange]: 變動列表（與純 Python 版語意一致）
+        """
+        import numpy as np
+
+        # 同代碼後者覆蓋前者（dict 的 last-wins），同時保證 unique，
+        # 之後的集合運算才能開 assume_unique
+        y_map = dict(
+            zip(map(_get_code, yesterday_holdings), yesterday_holdings)
+        )
+        t_map = dict(zip(map(_get_code, today_holdings), today_holdings))
+
+        y_codes = np.array(list(y_map), dtype=str)
+        t_codes = np.array(list(t_map), dtype=str)
+        y_shares = np.fromiter(
+            (int(h.get('shares') or 0) for h in y_map.values()),
+            dtype=np.int64, count=len(y_map)
+        )
+        t_shares = np.fromiter(
+            (int(h.get('shares') or 0) for h in t_map.values()),
+            dtype=np.int64, count=len(t_map)
+        )
+
+        # isin 遮罩保留原陣列位置，新增/移除的股數欄可直接用同一組
+        # 索引切片，不必回頭查 dict
+        t_pos = np.nonzero(~np.isin(t_codes, y_codes, assume_unique=True))[0]
+        y_pos = np.nonzero(~np.isin(y_codes, t_codes, assume_unique=True))[0]
+        added = t_codes[t_pos]
+        removed = y_codes[y_pos]
+        both, y_idx, t_idx = np.intersect1d(
+            y_codes, t_codes, assume_unique=True, return_indices=True
+        )
+
+        changes = []
+
+        # 張數仍走 shares_to_lots（lru_cache）：np.round 先乘 100 再捨入，
+        # 半值案例（如 85 股 → 0.085 張）會和 round() 的正確捨入不一致，
+        # 同一筆持股不能因清單大小走不同路徑而印出不同張數
+        for code, shares in zip(added, t_shares[t_pos]):
+            shares = int(shares)
+            changes.append(HoldingChange(
+                change_type='ADDED',
+                stock_code=code,
+                stock_name=t_map[code].get('stock_name', ''),
+                new_shares=shares,
+                new_lots=self.shares_to_lots(shares)
+            ))
+
+        for code, shares in zip(removed, y_shares[y_pos]):
+            shares = int(shares)
+            changes.append(HoldingChange(
+                change_type='REMOVED',
+                stock_code=code,
+                stock_name=y_map[code].get('stock_name', ''),
+                old_shares=shares,
+                old_lots=self.shares_to_lots(shares)
+            ))
+
+        old_shares_arr = y_shares[y_idx]
+        new_shares_arr = t_shares[t_idx]
+        diffs = new_shares_arr - old_shares_arr
+        changed = diffs != 0
+
+        for code, old_shares, new_shares in zip(
+            both[changed],
+            old_shares_arr[changed],
+            new_shares_arr[changed]
+        ):
+            old_shares = int(old_shares)
+            new_shares = int(new_shares)
+            old_lots = self.shares_to_lots(old_shares)
+            new_lots = self.shares_to_lots(new_shares)
+            changes.append(HoldingChange(
+                change_type='SHARES_UP' if new_shares > old_shares else 'SHARES_DOWN',
+                stock_code=code,
+                stock_name=t_map[code].get('stock_name', ''),
+                old_shares=old_shares,
+                new_shares=new_shares,
+                shares_diff=new_shares - old_shares,
+                old_lots=old_lots,
+                new_lots=new_lots,
+                lots_diff=new_lots - old_lots
+            ))
+
+        return changes
+
     def detect_changes(self, etf_code: str, current_date: str) -> Optional[List[HoldingChange]]:
         """
         偵測特定ETF在指定日期的變動
@@ -174,6 +295,10 @@ class HoldingsAnalyzer:
         代價：來源某天沒有前進時（歷史模擬中信 8 次、富邦 3 次），該檔會以同一個資料
         日期再被報一次。重複顯示比整檔消失好，且持股卡片上的 data_date 會標出實際日期。
 
+        逐檔呼叫 detect_changes 是典型的 N+1 查詢（每檔 4 次 DB 往返、各開連線）；
+        改用 Database 的批次查詢後整批固定 3 次往返：所有 ETF 的最新日期、
+        各自的前一交易日、兩日持股一次撈齊，比對則全在本地進行。
+
         Args:
             etf_codes: ETF 代碼列表
             current_date: 報表日期，作為上限（不會取到晚於這天的資料）
@@ -181,16 +306,39 @@ class HoldingsAnalyzer:
         Returns:
             Dict[str, List[HoldingChange]]: ETF代碼 -> 變動列表的字典
         """
-        all_changes = {}
+        if not etf_codes:
+            return {}
 
+        # 上限之前完全沒有資料的 ETF 不會出現在 latest_dates，直接被跳過
+        latest_dates = self.db.get_latest_dates_on_or_before(etf_codes, current_date)
+        previous_dates = self.db.get_previous_trading_dates(latest_dates)
+
+        pairs = []
+        for etf_code, etf_date in latest_dates.items():
+            pairs.append((etf_code, etf_date))
+            previous_date = previous_dates.get(etf_code)
+            if previous_date:
+                pairs.append((etf_code, previous_date))
+        holdings_map = self.db.get_holdings_for_etf_dates(pairs)
+
+        all_changes = {}
         for etf_code in etf_codes:
-            # 上限之前完全沒有資料的 ETF 直接跳過
-            etf_date = self.db.get_latest_date_on_or_before(etf_code, current_date)
+            etf_date = latest_dates.get(etf_code)
             if not etf_date:
                 continue
 
-            changes = self.detect_changes(etf_code, etf_date)
+            previous_date = previous_dates.get(etf_code)
+            if not previous_date:
+                logger.debug(f"No previous data found for {etf_code} before {etf_date}")
+                continue
+
+            today_holdings = holdings_map.get((etf_code, etf_date), [])
+            if not today_holdings:
+                logger.warning(f"No holdings found for {etf_code} on {etf_date}")
+                continue
 
+            yesterday_holdings = holdings_map.get((etf_code, previous_date), [])
+            changes = self.compare_holdings(yesterday_holdings, today_holdings)
             if changes:
                 all_changes[etf_code] = changes
 
@@ -212,6 +360,48 @@ class HoldingsAnalyzer:
         
         return self.detect_changes_batch(etf_codes, current_date)
     
+    def _prepare_report_rows(
+        self, changes_dict: Dict[str, List[HoldingChange]]
+    ) -> List[tuple]:
+        """
+        把變動字典整理成兩種報表共用的中間結構
+
+        文字版與 Markdown 版各自排序、各自跑三趟 list comprehension
+        分類同一份 changes；抽成一次排序 + 單趟分桶，兩個產生器
+        直接消費整理好的列表（ETF 名稱表也只建一次）。
+
+        Returns:
+            List[tuple]: (etf_code, etf_name, added, removed, modified)，
+                依 ETF 代碼排序
+        """
+        # ETF 名稱一次查齊建表（實例層快取），不在迴圈裡逐檔打 DB
+        if self._etf_name_map is None:
+            self._etf_name_map = {
+                e['etf_code']: e['etf_name'] for e in self.db.get_active_etfs()
+            }
+        etf_name_map = self._etf_name_map
+
+        rows = []
+        for etf_code, changes in sorted(changes_dict.items()):
+            added: List[HoldingChange] = []
+            removed: List[HoldingChange] = []
+            modified: List[HoldingChange] = []
+            for change in changes:
+                if change.change_type == 'ADDED':
+                    added.append(change)
+                elif change.change_type == 'REMOVED':
+                    removed.append(change)
+                else:
+                    modified.append(change)
+            rows.append((
+                etf_code,
+                etf_name_map.get(etf_code, etf_code),
+                added,
+                removed,
+                modified
+            ))
+        return rows
+
     def generate_report(self, changes_dict: Dict[str, List[HoldingChange]], date: str) -> str:
         """
         生成變動報告
@@ -225,72 +415,77 @@ class HoldingsAnalyzer:
         """
         if not changes_dict:
             return f"\n=== {date} ETF成分股變動報告 ===\n\n無變動\n"
-        
-        report_lines = [
-            f"\n{'='*60}",
-            f"=== {date} ETF成分股變動報告 ===",
-            f"{'='*60}\n"
-        ]
-        
+
+        # StringIO 直寫：每行格式化完直接進緩衝區，不在 list 裡
+        # 累積一份中間字串再 join 一次
+        import io
+        buf = io.StringIO()
+        write = buf.write
+
+        write(f"\n{_SEP}\n=== {date} ETF成分股變動報告 ===\n{_SEP}\n\n")
+
         total_changes = 0
-        
-        for etf_code, changes in sorted(changes_dict.items()):
-            # 取得ETF名稱
-            etf_info = self.db.get_active_etfs()
-            etf_name = next((e['etf_name'] for e in etf_info if e['etf_code'] == etf_code), etf_code)
-            
-            report_lines.append(f"【{etf_code} - {etf_name}】")
-            
-            # 分類變動
-            added = [c for c in changes if c.change_type == 'ADDED']
-            removed = [c for c in changes if c.change_type == 'REMOVED']
-            modified = [c for c in changes if c.change_type not in ['ADDED', 'REMOVED']]
-            
+
+        for etf_code, etf_name, added, removed, modified in \
+                self._prepare_report_rows(changes_dict):
+            write(f"【{etf_code} - {etf_name}】\n")
+
+            # 樹狀前綴：最後一列拆出來單獨寫，迴圈內不必每列做
+            # len()-1 比較（├─ 給前段、└─ 給尾列）
+
             # 新增成分股
             if added:
-                report_lines.append(f"  新增成分股 ({len(added)}):")
-                for i, change in enumerate(added):
-                    prefix = "├─" if i < len(added) - 1 else "└─"
-                    report_lines.append(
-                        f"    {prefix} {change.stock_code} {change.stock_name} "
-                        f"(持股: {change.new_lots:.2f}張)"
+                write(f"  新增成分股 ({len(added)}):\n")
+                *head, last = added
+                for change in head:
+                    write(
+                        f"    ├─ {change.stock_code} {change.stock_name} "
+                        f"(持股: {change.new_lots:.2f}張)\n"
                     )
-                report_lines.append("")
-            
+                write(
+                    f"    └─ {last.stock_code} {last.stock_name} "
+                    f"(持股: {last.new_lots:.2f}張)\n\n"
+                )
+
             # 移除成分股
             if removed:
-                report_lines.append(f"  移除成分股 ({len(removed)}):")
-                for i, change in enumerate(removed):
-                    prefix = "├─" if i < len(removed) - 1 else "└─"
-                    report_lines.append(
-                        f"    {prefix} {change.stock_code} {change.stock_name} "
-                        f"(昨日持股: {change.old_lots:.2f}張)"
+                write(f"  移除成分股 ({len(removed)}):\n")
+                *head, last = removed
+                for change in head:
+                    write(
+                        f"    ├─ {change.stock_code} {change.stock_name} "
+                        f"(昨日持股: {change.old_lots:.2f}張)\n"
                     )
-                report_lines.append("")
-            
+                write(
+                    f"    └─ {last.stock_code} {last.stock_name} "
+                    f"(昨日持股: {last.old_lots:.2f}張)\n\n"
+                )
+
             # 持股變動
             if modified:
-                report_lines.append(f"  持股變動 ({len(modified)}):")
-                for i, change in enumerate(modified):
-                    prefix = "├─" if i < len(modified) - 1 else "└─"
-                    
-                    # 持股變動
-                    lots_arrow = "▲" if change.lots_diff > 0 else "▼"
-                    report_lines.append(
-                        f"    {prefix} {change.stock_code} {change.stock_name} "
+                write(f"  持股變動 ({len(modified)}):\n")
+                *head, last = modified
+                for change in head:
+                    lots_arrow = _ARROW_UP if change.lots_diff > 0 else _ARROW_DOWN
+                    write(
+                        f"    ├─ {change.stock_code} {change.stock_name} "
                         f"持股: {change.old_lots:.2f}張 → {change.new_lots:.2f}張 "
-                        f"({lots_arrow}{abs(change.lots_diff):.2f}張)"
+                        f"({lots_arrow}{abs(change.lots_diff):.2f}張)\n"
                     )
-                
-                report_lines.append("")
-            
-            total_changes += len(changes)
-        
+                lots_arrow = _ARROW_UP if last.lots_diff > 0 else _ARROW_DOWN
+                write(
+                    f"    └─ {last.stock_code} {last.stock_name} "
+                    f"持股: {last.old_lots:.2f}張 → {last.new_lots:.2f}張 "
+                    f"({lots_arrow}{abs(last.lots_diff):.2f}張)\n\n"
+                )
+
+            total_changes += len(added) + len(removed) + len(modified)
+
         # 總結
-        report_lines.append(f"總計：處理 {len(changes_dict)} 個ETF，發現 {total_changes} 筆變動")
-        report_lines.append(f"{'='*60}\n")
-        
-        return "\n".join(report_lines)
+        write(f"總計：處理 {len(changes_dict)} 個ETF，發現 {total_changes} 筆變動\n")
+        write(f"{_SEP}\n")
+
+        return buf.getvalue()
 
     def generate_markdown_report(self, changes_dict: Dict[str, List[HoldingChange]], date: str) -> str:
         """
@@ -319,51 +514,57 @@ class HoldingsAnalyzer:
             f"**本日共 {len(changes_dict)} 檔 ETF 發生 {total_changes} 筆變動**\n"
         ]
         
-        for etf_code, changes in sorted(changes_dict.items()):
-            # 取得ETF名稱
-            etf_info = self.db.get_active_etfs()
-            etf_name = next((e['etf_name'] for e in etf_info if e['etf_code'] == etf_code), etf_code)
-            
-            # 分類變動
-            added = [c for c in changes if c.change_type == 'ADDED']
-            removed = [c for c in changes if c.change_type == 'REMOVED']
-            modified = [c for c in changes if c.change_type not in ['ADDED', 'REMOVED']]
-            
+        for etf_code, etf_name, added, removed, modified in \
+                self._prepare_report_rows(changes_dict):
+            change_count = len(added) + len(removed) + len(modified)
+
             # 使用折疊區塊
             md_lines.append(f'<details open>')
-            md_lines.append(f'<summary><b>{etf_code}</b> {etf_name} ({len(changes)} 筆變動)</summary>\n')
+            md_lines.append(f'<summary><b>{etf_code}</b> {etf_name} ({change_count} 筆變動)</summary>\n')
             
+            # 每張表的資料列以 list comprehension 一次生成、extend 一次
+            # 進主列表，取代迴圈裡逐列 append（省掉反覆的 list 擴容）
+
             # 新增成分股
             if added:
-                md_lines.append("### ➕ 新增成分股\n")
-                md_lines.append("| 股票代碼 | 股票名稱 | 持股張數 |")
-                md_lines.append("|---------|---------|---------|")
-                for change in added:
-                    md_lines.append(f"| {change.stock_code} | {change.stock_name} | {change.new_lots:.2f}張 |")
+                md_lines.extend((
+                    "### ➕ 新增成分股\n",
+                    "| 股票代碼 | 股票名稱 | 持股張數 |",
+                    "|---------|---------|---------|",
+                ))
+                md_lines.extend(
+                    f"| {c.stock_code} | {c.stock_name} | {c.new_lots:.2f}張 |"
+                    for c in added
+                )
                 md_lines.append("")
-            
+
             # 移除成分股
             if removed:
-                md_lines.append("### ➖ 移除成分股\n")
-                md_lines.append("| 股票代碼 | 股票名稱 | 原持股張數 |")
-                md_lines.append("|---------|---------|----------|")
-                for change in removed:
-                    md_lines.append(f"| {change.stock_code} | {change.stock_name} | {change.old_lots:.2f}張 |")
+                md_lines.extend((
+                    "### ➖ 移除成分股\n",
+                    "| 股票代碼 | 股票名稱 | 原持股張數 |",
+                    "|---------|---------|----------|",
+                ))
+                md_lines.extend(
+                    f"| {c.stock_code} | {c.stock_name} | {c.old_lots:.2f}張 |"
+                    for c in removed
+                )
                 md_lines.append("")
-            
+
             # 持股變動
             if modified:
-                md_lines.append("### 📊 持股變動\n")
-                md_lines.append("| 股票代碼 | 股票名稱 | 變動 | 原持股 | 新持股 | 增減 |")
-                md_lines.append("|---------|---------|-----|--------|--------|------|")
-                for change in modified:
-                    emoji = "📈" if change.lots_diff > 0 else "📉"
-                    sign = "+" if change.lots_diff > 0 else ""
-                    md_lines.append(
-                        f"| {change.stock_code} | {change.stock_name} | {emoji} | "
-                        f"{change.old_lots:,.0f}張 | {change.new_lots:,.0f}張 | "
-                        f"{sign}{change.lots_diff:,.0f}張 |"
-                    )
+                md_lines.extend((
+                    "### 📊 持股變動\n",
+                    "| 股票代碼 | 股票名稱 | 變動 | 原持股 | 新持股 | 增減 |",
+                    "|---------|---------|-----|--------|--------|------|",
+                ))
+                md_lines.extend(
+                    f"| {c.stock_code} | {c.stock_name} | "
+                    f"{'📈' if c.lots_diff > 0 else '📉'} | "
+                    f"{c.old_lots:,.0f}張 | {c.new_lots:,.0f}張 | "
+                    f"{'+' if c.lots_diff > 0 else ''}{c.lots_diff:,.0f}張 |"
+                    for c in modified
+                )
                 md_lines.append("")
             
             md_lines.append("</details>\n")
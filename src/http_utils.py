@@ -0,0 +1,82 @@
+"""
+HTTP 共用工具：重試策略、SSLContext 與連線池設定
+
+每個 scraper 自行建 Retry/HTTPAdapter 除了重複程式碼，Retry 的建構
+（allowed_methods 正規化等）也不便宜；集中在模組層建一次、所有 scraper 共用。
+"""
+import ssl
+import threading
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import MAX_RETRIES
+
+# 多個來源走 verify=False，警告在模組載入時停用一次即可
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# 共用重試策略：模組載入時建一次，所有 session 重用
+_RETRY = Retry(
+    total=MAX_RETRIES,
+    backoff_factor=1,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset(['GET', 'POST'])
+)
+
+# verify=False 只是不驗證憑證，每條新連線仍要做完整 TLS 握手。
+# 預建一個 SSLContext 讓連線池共用，TLS session ticket 得以重用，
+# keep-alive 之外的新連線也能走簡化握手（省一個 RTT + 非對稱加密）。
+_SSL_CONTEXT = ssl.create_default_context()
+_SSL_CONTEXT.check_hostname = False
+_SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+
+class SSLContextAdapter(HTTPAdapter):
+    """讓連線池共用同一個預建 SSLContext 的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = _SSL_CONTEXT
+        return super().init_poolmanager(*args, **kwargs)
+
+
+def make_session() -> requests.Session:
+    """
+    建立掛好共用重試策略與放大連線池（32 條）的 Session
+
+    Returns:
+        requests.Session: 配置好的 session
+    """
+    session = requests.Session()
+    adapter = SSLContextAdapter(
+        max_retries=_RETRY,
+        pool_connections=32,
+        pool_maxsize=32,
+        pool_block=False
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# 跨 scraper 實例共用的 Session：排程器若每檔 ETF 各建一個 scraper，
+# 各自的連線池（與已握手的 TLS 連線）會被整組丟棄；改用模組層單例
+# 讓底層 urllib3 連線池跨實例存活
+_SHARED_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_shared_session() -> requests.Session:
+    """
+    取得模組層共用的 Session（延遲建立，thread-safe）
+
+    Returns:
+        requests.Session: 所有呼叫者共用的 session
+    """
+    global _SHARED_SESSION
+    if _SHARED_SESSION is None:
+        with _SESSION_LOCK:
+            if _SHARED_SESSION is None:
+                _SHARED_SESSION = make_session()
+    return _SHARED_SESSION
@@ -3,8 +3,6 @@
 專門處理野村投信網站的 ETF 資料抓取
 """
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import time
 import random
 from typing import List, Dict, Any, Optional
@@ -13,9 +11,27 @@ from loguru import logger
 
 from .config import (
     REQUEST_DELAY_MIN,
-    REQUEST_DELAY_MAX,
-    MAX_RETRIES
+    REQUEST_DELAY_MAX
 )
+from .http_utils import get_shared_session
+
+# 持股回應可達數百 KB，orjson（C 實作）解析快 2-3 倍且直接吃 bytes；
+# 未安裝時退回內建 json（orjson 的錯誤是 ValueError 子類，呼叫端不用改）
+try:
+    import orjson as _json_impl
+
+    def _json_loads(raw) -> Any:
+        return _json_impl.loads(raw)
+except ImportError:
+    import json as _json_impl
+
+    def _json_loads(raw) -> Any:
+        return _json_impl.loads(raw)
+
+
+# 數值清理用的刪除表：str.translate 一趟 C 掃描就完成，
+# 連鎖 str.replace 要各自配置中間字串、掃多趟
+_NUM_STRIP = str.maketrans('', '', ', %\t')
 
 
 # 野村投信 ETF 基金代碼對照表
@@ -34,36 +50,13 @@ class NomuraScraper:
     
     def __init__(self):
         """初始化爬蟲"""
-        self.session = self._create_session()
+        # 模組層共用的 Session：連線池與已握手的 TLS 連線跨 scraper
+        # 實例存活（批次抓多組 ETF/日期只付一次握手），帶共用重試策略；
+        # InsecureRequestWarning 已在 http_utils 模組載入時停用。
+        # 標頭走每請求的 _get_headers()，不污染共用 session
+        self.session = get_shared_session()
         self.request_count = 0
-    
-    def _create_session(self) -> requests.Session:
-        """
-        建立 HTTP Session 並設定重試策略
-        
-        Returns:
-            requests.Session: 配置好的 session
-        """
-        session = requests.Session()
-        
-        # 禁用 SSL 驗證警告
-        import urllib3
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        
-        # 設定重試策略
-        retry_strategy = Retry(
-            total=MAX_RETRIES,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST"]
-        )
-        
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        
-        return session
-    
+
     def _get_headers(self) -> Dict[str, str]:
         """
         獲取請求標頭
@@ -142,13 +135,14 @@ class NomuraScraper:
             response.raise_for_status()
             
             logger.debug(f"Response status: {response.status_code}")
-            logger.debug(f"Response length: {len(response.text)} characters")
-            
-            if not response.text:
+            logger.debug(f"Response length: {len(response.content)} bytes")
+
+            if not response.content:
                 logger.error(f"Empty response received for {fund_id}")
                 return None
-            
-            data = response.json()
+
+            # 直接解析 bytes，省掉 response.json() 的整段 UTF-8 解碼
+            data = _json_loads(response.content)
             logger.debug(f"Request successful: {fund_id}")
             return data
         
@@ -213,20 +207,25 @@ class NomuraScraper:
                 if table_title == '股票':
                     rows = table.get('Rows', [])
                     logger.info(f"Found {len(rows)} stock holdings")
-                    
+
+                    # 迴圈外先綁好 method/append 的區域變數：省掉每列
+                    # 的屬性查找（數百列 × 3 次 LOAD_ATTR）
+                    parse_number = self._parse_number
+                    parse_percentage = self._parse_percentage
+                    append = holdings.append
+
                     # Rows 是二維陣列，每行格式: [股票代號, 股票名稱, 股數, 權重(%)]
                     for row in rows:
                         if len(row) >= 4:  # 確保有足夠的欄位
-                            holding = {
+                            append({
                                 'etf_code': etf_code,
                                 'stock_code': row[0],
                                 'stock_name': row[1],
-                                'shares': self._parse_number(row[2]),
+                                'shares': parse_number(row[2]),
                                 'market_value': 0,  # API 未提供市值
-                                'weight': self._parse_percentage(row[3]),
+                                'weight': parse_percentage(row[3]),
                                 'date': date
-                            }
-                            holdings.append(holding)
+                            })
             
             logger.info(f"Parsed {len(holdings)} holdings for {etf_code} on {date}")
         
@@ -236,6 +235,42 @@ class NomuraScraper:
         
         return holdings
     
+    def get_many_holdings(
+        self,
+        pairs: List[tuple],
+        max_workers: int = 5
+    ) -> Dict[tuple, List[Dict[str, Any]]]:
+        """
+        批次抓取多組 (ETF 代碼, 日期) 的持股明細
+
+        逐組序列抓取時，總耗時是每組的隨機延遲加上 RTT 的總和；改用
+        有上限的執行緒池讓各組的延遲與網路等待互相重疊，總耗時約縮為
+        1/max_workers（同 FHTrust 的 get_historical_holdings 做法）。
+        並行上限預設 5，避免對來源造成壓力。
+
+        Args:
+            pairs: (etf_code, date) 組合列表
+            max_workers: 並行上限
+
+        Returns:
+            Dict[tuple, List[Dict]]: (etf_code, date) -> 持股明細列表
+                （失敗的組合為空列表）
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not pairs:
+            return {}
+
+        logger.info(
+            f"Fetching {len(pairs)} holdings snapshots from Nomura "
+            f"with {max_workers} workers"
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda pair: self.get_etf_holdings(*pair), pairs
+            )
+            return dict(zip(pairs, results))
+
     @staticmethod
     def _parse_number(value: Any) -> int:
         """
@@ -247,13 +282,15 @@ class NomuraScraper:
         Returns:
             int: 解析後的整數
         """
-        if isinstance(value, (int, float)):
+        # API 給的值多半已是 int/float：先直接嘗試轉型（成功路徑零
+        # isinstance 檢查），字串清理留給例外分支，translate 一趟掃完
+        try:
             return int(value)
-        if isinstance(value, str):
-            # 移除逗號和空格
-            clean_value = value.replace(',', '').replace(' ', '').strip()
-            return int(float(clean_value)) if clean_value else 0
-        return 0
+        except (TypeError, ValueError):
+            try:
+                return int(float(str(value).translate(_NUM_STRIP)))
+            except ValueError:
+                return 0
     
     @staticmethod
     def _parse_percentage(value: Any) -> float:
@@ -266,13 +303,14 @@ class NomuraScraper:
         Returns:
             float: 解析後的浮點數
         """
-        if isinstance(value, (int, float)):
+        # 同 _parse_number：先走已是數值的快速路徑
+        try:
             return float(value)
-        if isinstance(value, str):
-            # 移除 % 和空格
-            clean_value = value.replace('%', '').replace(',', '').replace(' ', '').strip()
-            return float(clean_value) if clean_value else 0.0
-        return 0.0
+        except (TypeError, ValueError):
+            try:
+                return float(str(value).translate(_NUM_STRIP))
+            except ValueError:
+                return 0.0
     
     def add_etf_mapping(self, etf_code: str, fund_id: str):
         """
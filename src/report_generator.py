@@ -1,12 +1,39 @@
 """
 報告生成器模組 - 生成 HTML 格式的視覺化報告
 """
+from operator import attrgetter
 from typing import Dict, List
 from pathlib import Path
 import json
 from datetime import datetime, timedelta, timezone
 from .holdings_analyzer import HoldingChange
 
+# 儀表板主迴圈每筆 HoldingChange 要讀 3-8 個欄位；attrgetter 一次
+# C 呼叫取回六個欄位、tuple 解包成區域變數，省掉逐點屬性查找
+# （HoldingChange 已是 slots dataclass，欄位讀取本身也走 slot 描述器）
+_CHANGE_FIELDS = attrgetter(
+    'change_type', 'stock_code', 'stock_name',
+    'old_lots', 'new_lots', 'lots_diff'
+)
+
+# 每日報告的 JSON 可達數 MB（detailed_changes + 全部持股），orjson
+# （C 實作）序列化快一個量級且直接輸出 UTF-8 bytes，不經過
+# ensure_ascii 的逐字元轉義；未安裝時退回內建 json
+try:
+    import orjson as _orjson
+
+    def _json_dumps_indent(obj) -> bytes:
+        return _orjson.dumps(obj, option=_orjson.OPT_INDENT_2)
+
+    def _json_dumps(obj) -> bytes:
+        return _orjson.dumps(obj)
+except ImportError:
+    def _json_dumps_indent(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
 
 class HTMLReportGenerator:
     """HTML 報告生成器（提案 B：圖表視覺化式）"""
@@ -40,50 +67,101 @@ class HTMLReportGenerator:
             dict: 包含所有圖表資料的字典
         """
         total_changes = sum(len(changes) for changes in changes_dict.values())
-        
-        # 1. 變動分布數據（圓餅圖）
+
+        # 變動分布、熱門股票彙總與詳細變動列表融合成單趟掃描：
+        # 每個 HoldingChange 只被迭代一次（原本分布/熱門/詳細三段
+        # 各掃一遍，詳細段內又對 changes 跑三趟分類 comprehension）
         change_distribution = []
+        stock_changes = {}  # stock_code -> {name, up_count, down_count, net_change, etf_details}
+        detailed_changes = []
+
+        # 每筆帶 data_date：變動是逐檔比對「各自最新可得的資料日期」得出的
+        # （HoldingsAnalyzer.detect_changes_batch），來源停更時同一筆變動會在
+        # 連續多個報表日期重複出現。沒有這個欄位，下游無法分辨「同一筆重複出現」
+        # 與「真的又動了一次」，個股反查的買賣張數就會把同一次調整重複計入。
+        # 來源與持股總覽同一個解析結果（get_latest_date_on_or_before），故直接沿用。
+        holdings_date_map = {
+            e['etf_code']: e.get('data_date')
+            for e in (etf_holdings or [])
+        }
+
         for etf_code, changes in sorted(changes_dict.items()):
             etf_name = etf_info_dict.get(etf_code, etf_code)
+
             change_distribution.append({
                 'etf_code': etf_code,
                 'etf_name': etf_name,
                 'count': len(changes)
             })
-        
-        # 2. 熱門調整股票統計
-        stock_changes = {}  # stock_code -> {name, up_count, down_count, net_change, etf_details}
-        
-        for etf_code, changes in changes_dict.items():
-            etf_name = etf_info_dict.get(etf_code, etf_code)
+
+            added = []
+            removed = []
+            modified = []
+
             for change in changes:
-                if change.change_type in ['SHARES_UP', 'SHARES_DOWN']:
-                    code = change.stock_code
-                    if code not in stock_changes:
-                        stock_changes[code] = {
-                            'name': change.stock_name,
+                ct, sc, sn, ol, nl, ld = _CHANGE_FIELDS(change)
+                if ct == 'ADDED':
+                    added.append({
+                        'stock_code': sc,
+                        'stock_name': sn,
+                        'lots': round(nl, 2)
+                    })
+                elif ct == 'REMOVED':
+                    removed.append({
+                        'stock_code': sc,
+                        'stock_name': sn,
+                        'lots': round(ol, 2)
+                    })
+                else:
+                    # 調整分支的 new_lots/diff 會同時進 modified 與
+                    # etf_details：先各 round 一次存區域變數再重用，
+                    # 省掉每筆 2 次重複的 round() 呼叫。方向判斷仍看
+                    # 未捨入的 ld（±0.004 張的微調 round 後是 0.00，
+                    # 用捨入值判斷會翻方向）
+                    nl_r = round(nl, 2)
+                    ld_r = round(ld, 2)
+                    modified.append({
+                        'stock_code': sc,
+                        'stock_name': sn,
+                        'old_lots': round(ol, 2),
+                        'new_lots': nl_r,
+                        'diff': ld_r,
+                        'direction': 'up' if ld > 0 else 'down'
+                    })
+
+                    # 熱門股票彙總：單次查找拿到該股的 entry，之後都走
+                    # 區域變數，不重複 stock_changes[code][...] 的雙層查
+                    # 找；net_change 兩個分支加法相同，提到分支外
+                    entry = stock_changes.get(sc)
+                    if entry is None:
+                        entry = stock_changes[sc] = {
+                            'name': sn,
                             'up_count': 0,
                             'down_count': 0,
                             'net_change': 0,
                             'etf_details': []
                         }
-                    
+
                     # 記錄 ETF 調整詳情
-                    etf_detail = {
+                    entry['etf_details'].append({
                         'etf_code': etf_code,
                         'etf_name': etf_name,
-                        'adjustment': round(change.lots_diff, 2),
-                        'new_lots': round(change.new_lots, 2)
-                    }
-                    stock_changes[code]['etf_details'].append(etf_detail)
-                    
-                    if change.change_type == 'SHARES_UP':
-                        stock_changes[code]['up_count'] += 1
-                        stock_changes[code]['net_change'] += change.lots_diff
-                    else:
-                        stock_changes[code]['down_count'] += 1
-                        stock_changes[code]['net_change'] += change.lots_diff
-        
+                        'adjustment': ld_r,
+                        'new_lots': nl_r
+                    })
+                    entry['net_change'] += ld
+                    entry['up_count' if ct == 'SHARES_UP' else 'down_count'] += 1
+
+            detailed_changes.append({
+                'etf_code': etf_code,
+                'etf_name': etf_name,
+                'data_date': holdings_date_map.get(etf_code, date),
+                'total_changes': len(changes),
+                'added': added,
+                'removed': removed,
+                'modified': modified
+            })
+
         # 補充權重資訊
         if etf_holdings:
             for stock_code, stock_data in stock_changes.items():
@@ -100,7 +178,9 @@ class HTMLReportGenerator:
                                     break
                             break
         
-        # 排序：按調整次數
+        # 取調整次數前 10 名：heapq.nlargest 是 O(n log 10) 的 top-k
+        # 選擇，不必為了前 10 筆全排序；輸出 dict 也只建最後那 10 個
+        import heapq
         hot_stocks = [
             {
                 'stock_code': code,
@@ -109,66 +189,11 @@ class HTMLReportGenerator:
                 'net_change': round(data['net_change'], 2),
                 'etf_details': data['etf_details']
             }
-            for code, data in stock_changes.items()
+            for code, data in heapq.nlargest(
+                10, stock_changes.items(),
+                key=lambda kv: kv[1]['up_count'] + kv[1]['down_count']
+            )
         ]
-        hot_stocks.sort(key=lambda x: x['total_adjustments'], reverse=True)
-        hot_stocks = hot_stocks[:10]  # 取前 10 名
-        
-        # 3. 詳細變動列表
-        #
-        # 每筆帶 data_date：變動是逐檔比對「各自最新可得的資料日期」得出的
-        # （HoldingsAnalyzer.detect_changes_batch），來源停更時同一筆變動會在
-        # 連續多個報表日期重複出現。沒有這個欄位，下游無法分辨「同一筆重複出現」
-        # 與「真的又動了一次」，個股反查的買賣張數就會把同一次調整重複計入。
-        # 來源與持股總覽同一個解析結果（get_latest_date_on_or_before），故直接沿用。
-        holdings_date_map = {
-            e['etf_code']: e.get('data_date')
-            for e in (etf_holdings or [])
-        }
-
-        detailed_changes = []
-        for etf_code, changes in sorted(changes_dict.items()):
-            etf_name = etf_info_dict.get(etf_code, etf_code)
-
-            # 分類變動
-            added = [c for c in changes if c.change_type == 'ADDED']
-            removed = [c for c in changes if c.change_type == 'REMOVED']
-            modified = [c for c in changes if c.change_type not in ['ADDED', 'REMOVED']]
-
-            etf_changes = {
-                'etf_code': etf_code,
-                'etf_name': etf_name,
-                'data_date': holdings_date_map.get(etf_code, date),
-                'total_changes': len(changes),
-                'added': [
-                    {
-                        'stock_code': c.stock_code,
-                        'stock_name': c.stock_name,
-                        'lots': round(c.new_lots, 2)
-                    }
-                    for c in added
-                ],
-                'removed': [
-                    {
-                        'stock_code': c.stock_code,
-                        'stock_name': c.stock_name,
-                        'lots': round(c.old_lots, 2)
-                    }
-                    for c in removed
-                ],
-                'modified': [
-                    {
-                        'stock_code': c.stock_code,
-                        'stock_name': c.stock_name,
-                        'old_lots': round(c.old_lots, 2),
-                        'new_lots': round(c.new_lots, 2),
-                        'diff': round(c.lots_diff, 2),
-                        'direction': 'up' if c.lots_diff > 0 else 'down'
-                    }
-                    for c in modified
-                ]
-            }
-            detailed_changes.append(etf_changes)
         
         return {
             'date': date,
@@ -207,22 +232,35 @@ class HTMLReportGenerator:
         # 生成 JSON 資料
         data = self.generate_dashboard_data(changes_dict, date, etf_info_dict, etf_holdings)
         
-        # 儲存 JSON 資料檔
+        # 只序列化一次：同一份編碼結果寫進 .json 檔、也嵌進 HTML 的
+        # <script>，大報表不用付兩次編碼的 CPU 與記憶體
+        encoded = _json_dumps_indent(data)
+
+        # 儲存 JSON 資料檔：一次編成 bytes、一次寫入（json.dump 會
+        # 逐 token 呼叫 write），且 orjson 路徑直接輸出 UTF-8
         json_file = self.output_dir / f"data_{date}.json"
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
+        json_file.write_bytes(encoded)
+
         # 生成 HTML 報告
         html_file = self.output_dir / f"report_{date}.html"
-        html_content = self._generate_report_html(data)
+        html_content = self._generate_report_html(data, encoded.decode('utf-8'))
         
         with open(html_file, 'w', encoding='utf-8') as f:
             f.write(html_content)
         
         return html_file
     
-    def _generate_report_html(self, data: dict) -> str:
-        """生成報告 HTML 內容"""
+    def _generate_report_html(self, data: dict, encoded_json: str = None) -> str:
+        """
+        生成報告 HTML 內容
+
+        Args:
+            data: 儀表板資料
+            encoded_json: data 的既有 JSON 編碼（generate_daily_report 傳入，
+                重用寫檔的那份編碼；未提供時才自行序列化）
+        """
+        if encoded_json is None:
+            encoded_json = _json_dumps(data).decode('utf-8')
         date = data['date']
         summary = data['summary']
         
@@ -763,7 +801,7 @@ class HTMLReportGenerator:
     </div>
     
     <script>
-        const data = {json.dumps(data, ensure_ascii=False)};
+        const data = {encoded_json};
         
         // 持股總覽摺疊（有 max-height 捲動，用 CSS 切換即可）
         function toggleHoldingsCard(header) {{
@@ -909,51 +947,68 @@ class HTMLReportGenerator:
         return html
     
     def _generate_details_html(self, detailed_changes: List[dict]) -> str:
-        """生成詳細變動的 HTML（使用可摺疊卡片）"""
-        html_parts = []
-        
-        for etf_data in detailed_changes:
-            # 生成卡片內容
-            content_parts = []
-            
-            # 新增成分股
-            if etf_data['added']:
-                content_parts.append('<h4><span class="badge badge-add">➕ 新增成分股</span></h4>')
-                content_parts.append('<table class="changes-table">')
-                content_parts.append('<tr><th>股票代碼</th><th>股票名稱</th><th>持股張數</th></tr>')
-                for stock in etf_data['added']:
-                    content_parts.append(f"<tr><td>{stock['stock_code']}</td><td>{stock['stock_name']}</td><td>{stock['lots']:,.0f}張</td></tr>")
-                content_parts.append('</table>')
-            
-            # 移除成分股
-            if etf_data['removed']:
-                content_parts.append('<h4><span class="badge badge-remove">➖ 移除成分股</span></h4>')
-                content_parts.append('<table class="changes-table">')
-                content_parts.append('<tr><th>股票代碼</th><th>股票名稱</th><th>原持股張數</th></tr>')
-                for stock in etf_data['removed']:
-                    content_parts.append(f"<tr><td>{stock['stock_code']}</td><td>{stock['stock_name']}</td><td>{stock['lots']:,.0f}張</td></tr>")
-                content_parts.append('</table>')
-            
-            # 持股變動
-            if etf_data['modified']:
-                content_parts.append('<h4>📊 持股變動</h4>')
-                content_parts.append('<table class="changes-table">')
-                content_parts.append('<tr><th>股票代碼</th><th>股票名稱</th><th>原持股</th><th>新持股</th><th>增減</th></tr>')
-                for stock in etf_data['modified']:
-                    diff_class = 'up' if stock['direction'] == 'up' else 'down'
-                    arrow = '▲' if stock['direction'] == 'up' else '▼'
-                    sign = '+' if stock['diff'] > 0 else ''
-                    content_parts.append(
-                        f"<tr><td>{stock['stock_code']}</td><td>{stock['stock_name']}</td>"
-                        f"<td>{stock['old_lots']:,.0f}張</td><td>{stock['new_lots']:,.0f}張</td>"
-                        f"<td class='{diff_class}'>{arrow} {sign}{stock['diff']:,.0f}張</td></tr>"
-                    )
-                content_parts.append('</table>')
-            
-            content_html = '\n'.join(content_parts)
-            
-            # 生成可摺疊卡片
-            html_parts.append(f"""
+        """生成詳細變動的 HTML（使用可摺疊卡片）
+
+        每個區段以產生器 + 單次 ''.join 組出整段字串、卡片用單一
+        f-string 套版：取代原本逐列 list.append 再 join 的寫法，
+        省掉每列的方法呼叫與中間 list 配置，輸出位元組不變
+        """
+        return '\n'.join(
+            self._render_details_card(etf_data) for etf_data in detailed_changes
+        )
+
+    def _render_details_card(self, etf_data: dict) -> str:
+        """組出單一 ETF 的可摺疊變動卡片"""
+        sections = []
+
+        # 新增成分股
+        if etf_data['added']:
+            rows = ''.join(
+                f"\n<tr><td>{s['stock_code']}</td><td>{s['stock_name']}</td>"
+                f"<td>{s['lots']:,.0f}張</td></tr>"
+                for s in etf_data['added']
+            )
+            sections.append(
+                '<h4><span class="badge badge-add">➕ 新增成分股</span></h4>\n'
+                '<table class="changes-table">\n'
+                '<tr><th>股票代碼</th><th>股票名稱</th><th>持股張數</th></tr>'
+                f"{rows}\n</table>"
+            )
+
+        # 移除成分股
+        if etf_data['removed']:
+            rows = ''.join(
+                f"\n<tr><td>{s['stock_code']}</td><td>{s['stock_name']}</td>"
+                f"<td>{s['lots']:,.0f}張</td></tr>"
+                for s in etf_data['removed']
+            )
+            sections.append(
+                '<h4><span class="badge badge-remove">➖ 移除成分股</span></h4>\n'
+                '<table class="changes-table">\n'
+                '<tr><th>股票代碼</th><th>股票名稱</th><th>原持股張數</th></tr>'
+                f"{rows}\n</table>"
+            )
+
+        # 持股變動（direction 只會是 'up'/'down'，直接當 CSS class 用）
+        if etf_data['modified']:
+            rows = ''.join(
+                f"\n<tr><td>{s['stock_code']}</td><td>{s['stock_name']}</td>"
+                f"<td>{s['old_lots']:,.0f}張</td><td>{s['new_lots']:,.0f}張</td>"
+                f"<td class='{s['direction']}'>"
+                f"{'▲' if s['direction'] == 'up' else '▼'} "
+                f"{'+' if s['diff'] > 0 else ''}{s['diff']:,.0f}張</td></tr>"
+                for s in etf_data['modified']
+            )
+            sections.append(
+                '<h4>📊 持股變動</h4>\n'
+                '<table class="changes-table">\n'
+                '<tr><th>股票代碼</th><th>股票名稱</th><th>原持股</th><th>新持股</th><th>增減</th></tr>'
+                f"{rows}\n</table>"
+            )
+
+        content_html = '\n'.join(sections)
+
+        return f"""
             <div class="etf-card">
                 <div class="etf-card-header">
                     <h3>{etf_data['etf_code']} ({etf_data['total_changes']} 筆變動)</h3>
@@ -963,9 +1018,7 @@ class HTMLReportGenerator:
                     {content_html}
                 </div>
             </div>
-            """)
-        
-        return '\n'.join(html_parts)
+            """
     
     def _generate_etf_holdings_html(self, etf_holdings: List[dict]) -> str:
         """生成 ETF 持股總覽的 HTML"""
@@ -1,13 +1,56 @@
 """
 工具函數模組
 """
+import random
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import List
 import os
 from loguru import logger
 
 
+class RateLimiter:
+    """
+    Token-bucket 式速率限制器（同步版）
+
+    「先睡固定秒數再發請求」會把延遲和網路往返疊加，實際吞吐只有
+    速率上限 × (1 - RTT/間隔)。這裡改記「下一次允許發送的時刻」：
+    請求本身花掉的時間會折抵等待，平均速率仍受控制且保留隨機抖動，
+    防封鎖效果不變。
+
+    執行緒安全：批次回補會從 ThreadPoolExecutor 同時呼叫 wait()
+    （如 EZMoney 的 get_historical_pcf），_next_ok 的讀改寫若不上鎖，
+    同時進來的前幾個請求會全部零延遲齊發。改為在鎖內「預約」自己的
+    發送時刻，睡眠留在鎖外，等待中不會擋住其他執行緒預約。
+    """
+
+    def __init__(self, min_interval: float, max_interval: float):
+        """
+        Args:
+            min_interval: 兩次請求間的最小間隔（秒）
+            max_interval: 兩次請求間的最大間隔（秒）
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._next_ok = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """等到下一次允許發送的時刻；首次呼叫不等待"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_ok)
+            self._next_ok = slot + random.uniform(
+                self.min_interval, self.max_interval
+            )
+        delay = slot - now
+        if delay > 0:
+            logger.debug(f"Rate limiter waiting {delay:.2f} seconds...")
+            time.sleep(delay)
+
+
 def is_active_etf(code: str) -> bool:
     """
     判斷股票代碼是否為主動式ETF（代碼A結尾）